@@ -0,0 +1,13 @@
+"""
+JSONC 配置解析与加载
+"""
+from core.ConfigProvider import ConfigProvider, _read_config
+
+
+def bench_read_config(benchmark, config_file):
+    benchmark(_read_config, config_file)
+
+
+def bench_load_config(benchmark, config_file, monkeypatch):
+    monkeypatch.setattr(ConfigProvider, 'CONFIG_PATH', config_file)
+    benchmark(ConfigProvider.load_config, True)
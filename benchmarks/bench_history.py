@@ -0,0 +1,23 @@
+"""
+历史消息格式化与上下文构造
+"""
+from utils.bot.history import build_context, format_cache, format_history_messages
+
+
+def _fresh(messages: list) -> tuple:
+    # 每轮清空格式化结果缓存, 测量冷启动耗时
+    format_cache.clear()
+    return (messages,), {}
+
+
+def bench_format_history_messages(benchmark, history_messages):
+    benchmark.pedantic(format_history_messages, setup=lambda: _fresh(history_messages), rounds=50)
+
+
+def bench_build_context_cold(benchmark, history_messages):
+    benchmark.pedantic(build_context, setup=lambda: _fresh(history_messages), rounds=50)
+
+
+def bench_build_context_warm(benchmark, history_messages):
+    build_context(history_messages)
+    benchmark(build_context, history_messages)
@@ -0,0 +1,25 @@
+"""
+Gemini 图片预处理 (解码、缩放、JPEG 编码)
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('PIL')
+
+from utils.api.vision import GeminiFlash  # noqa: E402
+
+
+def bench_encode_image_sync(benchmark, sample_image):
+    with open(sample_image, 'rb') as f:
+        data = f.read()
+    benchmark(GeminiFlash._encode_image_sync, data)
+
+
+def bench_process_image(benchmark, sample_image):
+    # 包含文件读取与线程池调度
+    loop = asyncio.new_event_loop()
+    try:
+        benchmark(lambda: loop.run_until_complete(GeminiFlash.process_image(sample_image)))
+    finally:
+        loop.close()
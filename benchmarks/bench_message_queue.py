@@ -0,0 +1,33 @@
+"""
+MessageQueue 写入与读取
+"""
+from utils.MessageQueue import MessageQueue, MessageQueueManager
+
+QUEUE_SIZE = 50
+
+
+def bench_add_message(benchmark, history_messages):
+    def run():
+        queue = MessageQueue(QUEUE_SIZE)
+        for idx, message in enumerate(history_messages):
+            queue.add_message(idx, message)
+
+    benchmark(run)
+
+
+def bench_add_message_with_budget(benchmark, history_messages):
+    # 200 个会话共享 1MB 的内存上限, 写入时会不断淘汰会话
+    def run():
+        manager = MessageQueueManager(max_bytes=1024 * 1024)
+        for idx, message in enumerate(history_messages):
+            manager.get_or_create_queue(idx % 200, QUEUE_SIZE).add_message(idx, message)
+
+    benchmark(run)
+
+
+def bench_get_all_messages(benchmark, history_messages):
+    queue = MessageQueue(QUEUE_SIZE)
+    for idx, message in enumerate(history_messages):
+        queue.add_message(idx, message)
+
+    benchmark(queue.get_all_messages)
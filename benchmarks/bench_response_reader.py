@@ -0,0 +1,14 @@
+"""
+流式响应增量分句 (ResponseReader.feed, 原 get_sentences)
+"""
+from utils.api.OpenAI import ResponseReader
+
+
+def bench_feed(benchmark, stream_deltas):
+    def run():
+        reader = ResponseReader(None)
+        for delta in stream_deltas:
+            reader.feed(delta)
+        reader.flush()
+
+    benchmark(run)
@@ -0,0 +1,54 @@
+"""
+分句: 规则分句、进程内 spaCy、经过进程池的 spaCy
+"""
+import pytest
+
+from core.ConfigProvider import Spacy
+from utils.SentencesSpliter import RuleSentencesSpliter, SentencesSpliter, SentencesSpliterManager
+
+MODEL = 'zh_core_web_sm'
+
+
+@pytest.fixture(scope='module')
+def spacy_model():
+    pytest.importorskip('spacy')
+    if not SentencesSpliter.load_model(MODEL):
+        pytest.skip(f"spaCy 模型 {MODEL} 未安装")
+    yield
+    SentencesSpliter.release_model()
+
+
+@pytest.fixture(scope='module')
+def spacy_process(spacy_model):
+    # 模块级 fixture 不能使用 monkeypatch, 用 MonkeyPatch.context() 在结束时恢复全局配置
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in (('ENABLE', True), ('MODEL', MODEL), ('RuleMaxLength', 0), ('Workers', 1)):
+            mp.setattr(Spacy, key, value)
+        try:
+            if not SentencesSpliterManager.initialize_model():
+                pytest.skip("分句进程加载模型失败")
+            yield
+        finally:
+            if SentencesSpliterManager.executor is not None:
+                SentencesSpliterManager.executor.shutdown()
+                SentencesSpliterManager.executor = None
+
+
+def bench_rules_short(benchmark, sentences):
+    benchmark(lambda: [RuleSentencesSpliter.split_text(text) for text in sentences])
+
+
+def bench_rules_long(benchmark, long_text):
+    benchmark(RuleSentencesSpliter.split_text, long_text)
+
+
+def bench_spacy_in_process(benchmark, spacy_model, sentences):
+    benchmark(lambda: [SentencesSpliter.split_text(text) for text in sentences])
+
+
+def bench_spacy_batch(benchmark, spacy_model, sentences):
+    benchmark(SentencesSpliter.split_texts, sentences)
+
+
+def bench_spacy_process_hop(benchmark, spacy_process, sentences):
+    benchmark(lambda: [SentencesSpliterManager.split_text_sync(text) for text in sentences])
@@ -0,0 +1,55 @@
+"""
+CloudFlare.image_to_text 请求体编码的内存与耗时对比
+
+旧实现: 读入 bytes -> list(image_blob) -> json 序列化整数数组
+新实现: 内存缓冲区 memoryview -> build_request_body (base64 / 直接拼接的整数数组)
+
+用法: python -m benchmarks.cloudflare_encoding
+"""
+import json
+import os
+import time
+import tracemalloc
+
+from utils.api.vision.CloudFlare import PROMPT, build_request_body
+
+IMAGE_SIZES = (256 * 1024, 2 * 1024 * 1024)
+
+
+def legacy_body(image_blob: bytes) -> bytes:
+    inputs = {
+        "image": list(image_blob),
+        "prompt": PROMPT,
+        "max_tokens": 512
+    }
+    # 旧实现还会以 debug 级别格式化整个 inputs
+    _ = f"inputs: {inputs}"
+    return json.dumps(inputs).encode('utf-8')
+
+
+def measure(func, *args) -> tuple[float, int, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    body = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(body)
+
+
+def main():
+    print(f"{'image':>10} {'method':>8} {'time(ms)':>10} {'peak(MB)':>10} {'body(MB)':>10}")
+    for size in IMAGE_SIZES:
+        image = os.urandom(size)
+        cases = (
+            ("legacy", legacy_body, image),
+            ("array", build_request_body, memoryview(image), "array"),
+            ("base64", build_request_body, memoryview(image), "base64"),
+        )
+        for name, func, *args in cases:
+            elapsed, peak, body_size = measure(func, *args)
+            print(f"{size:>10} {name:>8} {elapsed * 1e3:>10.1f} {peak / 2 ** 20:>10.1f} {body_size / 2 ** 20:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
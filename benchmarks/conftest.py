@@ -0,0 +1,97 @@
+"""
+基准测试共用的固定语料
+
+所有语料都由固定的种子或仓库内的文件生成, 每次运行的输入完全相同, 结果才可以和保存的基线比较。
+"""
+import os
+import random
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'benchmarks', 'data')
+sys.path.insert(0, ROOT)
+
+SEED = 20240701
+
+
+@pytest.fixture(scope='session')
+def sentences() -> list:
+    """
+    分句语料: benchmarks/data/sentences.txt 的每一行去掉边界标记
+    """
+    with open(os.path.join(DATA, 'sentences.txt'), encoding='utf-8') as f:
+        return [line.rstrip('\n').replace('|', '') for line in f if line.strip() and not line.startswith('#')]
+
+
+@pytest.fixture(scope='session')
+def long_text(sentences) -> str:
+    """
+    约 2000 字的长文本, 超过规则分句的默认长度上限
+    """
+    rng = random.Random(SEED)
+    parts = []
+    while sum(len(part) for part in parts) < 2000:
+        parts.append(rng.choice(sentences))
+    return ''.join(parts)
+
+
+@pytest.fixture(scope='session')
+def stream_deltas(long_text) -> list:
+    """
+    模拟流式响应: 长文本按 1~4 个字符切成增量
+    """
+    rng = random.Random(SEED)
+    deltas, position = [], 0
+    while position < len(long_text):
+        size = rng.randint(1, 4)
+        deltas.append(long_text[position:position + size])
+        position += size
+    return deltas
+
+
+@pytest.fixture(scope='session')
+def history_messages(sentences) -> list:
+    """
+    2000 条聊天记录, 50 个群友轮流发言
+    """
+    rng = random.Random(SEED)
+    base = 1_700_000_000
+    return [{
+        "time": base + i * 7,
+        "user_id": 100000 + i % 50,
+        "nickname": f"群友{i % 50}",
+        "message": rng.choice(sentences)
+    } for i in range(2000)]
+
+
+@pytest.fixture(scope='session')
+def config_file(tmp_path_factory) -> str:
+    """
+    以 config.example.jsonc 为内容的临时配置文件
+    """
+    path = tmp_path_factory.mktemp('config') / 'config.jsonc'
+    shutil.copy(os.path.join(ROOT, 'config.example.jsonc'), path)
+    return str(path)
+
+
+@pytest.fixture(scope='session', params=[('photo.jpg', 'JPEG', (1920, 1080)), ('screenshot.png', 'PNG', (1280, 2400))],
+                ids=lambda param: param[0])
+def sample_image(request, tmp_path_factory) -> str:
+    """
+    用固定算法生成的样例图片: 一张大尺寸 JPEG 照片与一张长截图 PNG
+    """
+    image_module = pytest.importorskip('PIL.Image')
+    name, image_format, size = request.param
+    width, height = size
+
+    rng = random.Random(SEED)
+    image = image_module.linear_gradient('L').resize(size).convert('RGB')
+    noise = image_module.frombytes('RGB', size, rng.randbytes(width * height * 3))
+    image = image_module.blend(image, noise, 0.3)
+
+    path = tmp_path_factory.mktemp('images') / name
+    image.save(path, format=image_format)
+    return str(path)
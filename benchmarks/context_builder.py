@@ -0,0 +1,59 @@
+"""
+历史消息上下文构造的基准
+
+对比旧的 format_history_messages (逐条 += 拼接全部消息) 与 build_context
+(从最新消息向前取到 token 预算为止, 缓存每条消息的格式化结果与 token 数, 一次 join)。
+
+用法: python -m benchmarks.context_builder
+"""
+import time
+from datetime import datetime
+
+from utils.bot.history import build_context, format_cache
+
+BUDGET = 2000
+ROUNDS = 20
+
+
+def make_messages(count: int) -> list:
+    base = 1_700_000_000
+    return [{
+        "time": base + i,
+        "user_id": 100000 + i % 50,
+        "nickname": f"群友{i % 50}",
+        "message": f"第{i}条消息, 今天吃什么 hhh" * (1 + i % 3)
+    } for i in range(count)]
+
+
+def legacy_format(messages: list) -> str:
+    formatted = ""
+    for msg in messages:
+        formatted += (f"[{datetime.fromtimestamp(msg['time'])}][名字: {msg['nickname']}, QQ号: {msg['user_id']}]"
+                      f"消息: \"{msg['message']}\"\n")
+    return formatted
+
+
+def measure(func, messages: list) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        func(messages)
+    return (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    print(f"{'messages':>9} {'legacy(ms)':>11} {'first(ms)':>10} {'cached(ms)':>11}")
+    for count in (1_000, 5_000, 20_000):
+        legacy = measure(legacy_format, make_messages(count))
+
+        messages = make_messages(count)
+        format_cache.clear()
+        start = time.perf_counter()
+        build_context(messages, BUDGET)
+        first = time.perf_counter() - start
+        cached = measure(lambda m: build_context(m, BUDGET), messages)
+
+        print(f"{count:>9} {legacy * 1e3:>11.2f} {first * 1e3:>10.3f} {cached * 1e3:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+插件导入耗时检查
+
+用 python -X importtime 在子进程中初始化 nonebot 并加载 plugins 目录下的全部插件,
+统计累计导入耗时, 并检查重量级的可选依赖 (spaCy、PIL 等) 没有在导入阶段被加载。
+超出预算或加载了禁止的模块时以非零状态退出, 可用于 CI。
+
+用法: python -m benchmarks.import_time [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+# 只应在第一次使用时才导入的模块
+FORBIDDEN = ('spacy', 'PIL', 'httpx', 'thinc', 'torch')
+
+LOAD_PLUGINS = (
+    "import nonebot\n"
+    "from nonebot.adapters.onebot.v11 import Adapter\n"
+    "nonebot.init()\n"
+    "nonebot.get_driver().register_adapter(Adapter)\n"
+    "nonebot.load_plugins('plugins')\n"
+)
+
+line_re = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$')
+
+
+def run(code: str) -> list:
+    """
+    返回 (模块名, 自身耗时 us, 累计耗时 us, 层级) 列表
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-2000:])
+        raise SystemExit(f"插件加载失败, 退出码 {proc.returncode}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if (match := line_re.match(line)) is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=1500, help="全部导入的累计耗时上限 (毫秒)")
+    parser.add_argument('--top', type=int, default=15, help="输出累计耗时最多的前 N 个顶层模块")
+    args = parser.parse_args()
+
+    entries = run(LOAD_PLUGINS)
+    top_level = [entry for entry in entries if entry[3] == 0]
+    total_ms = sum(entry[2] for entry in top_level) / 1000
+
+    print(f"{'module':<48}{'cumulative':>14}")
+    for name, _, cumulative_us, _ in sorted(top_level, key=lambda entry: -entry[2])[:args.top]:
+        print(f"{name:<48}{cumulative_us / 1000:>11.1f} ms")
+    print(f"{'total':<48}{total_ms:>11.1f} ms")
+
+    failed = False
+    loaded = {entry[0].split('.')[0] for entry in entries}
+    for name in FORBIDDEN:
+        if name in loaded:
+            print(f"FAIL: {name} 在插件导入阶段被加载")
+            failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: 导入耗时 {total_ms:.1f} ms 超出预算 {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+离线端到端压测
+
+启动本地模拟上游 (benchmarks/mock_servers.py), 并以 OneBot v11 反向 WebSocket 客户端的身份连接机器人,
+按固定速率回放合成的群聊/私聊消息, 同时应答机器人调用的 OneBot 接口 (send_msg、get_msg 等)。
+
+统计:
+  - 机器人处理的事件数/秒 (来自机器人 /metrics 中的伪人触发判定计数)
+  - 回复延迟分位数: 伪人回复按模型回复中的 "#消息ID" 标记对应到触发消息,
+    图片识别回复按描述中的 "[img:消息ID]" 标记对应到命令消息, 没有标记的回复 (如识别失败) 不计入
+  - 机器人事件循环延迟 (来自 /metrics 的 event_loop_lag_max_seconds)
+
+使用前先把模拟服务的地址写入机器人的 config.jsonc (python -m benchmarks.mock_servers --print-config),
+启动机器人, 再运行本脚本。
+
+用法: python -m benchmarks.load_harness [--rate 50] [--duration 60] [--groups 20] [--command-ratio 0.05]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+
+import aiohttp
+
+from benchmarks import mock_servers
+
+marker_re = re.compile(r'#(\d+)')
+image_tag_re = re.compile(r'\[img:(\d+)\]')
+
+SELF_ID = 10000
+TEXTS = ("今天吃什么", "有人打游戏吗", "这个好好笑", "哈哈哈哈", "明天要下雨吗", "刚下班, 累死了", "晚上一起开黑")
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def message_text(message) -> str:
+    if isinstance(message, str):
+        return message
+    if isinstance(message, dict):
+        message = [message]
+    return ''.join(str(segment.get("data", {}).get("text", "")) for segment in message
+                   if isinstance(segment, dict) and segment.get("type") == "text")
+
+
+def parse_metrics(text: str) -> dict:
+    """
+    解析 Prometheus 文本格式, 返回 {指标名: 所有标签的合计值}
+    """
+    values: dict = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        name_labels, _, value = line.rpartition(' ')
+        name = name_labels.split('{', 1)[0]
+        try:
+            values[name] = values.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+    return values
+
+
+class FakeOneBot:
+    """
+    模拟 OneBot v11 实现 (反向 WebSocket, Universal 角色)
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.ws: aiohttp.ClientWebSocketResponse | None = None
+        self.ids = itertools.count(1)
+        self.rng = random.Random(args.seed)
+        self.sent_at: dict = {}
+        # 命令消息 ID -> 等待图片识别回复的命令发送时间
+        self.pending_commands: dict = {}
+        self.chat_latencies: list = []
+        self.vision_latencies: list = []
+        self.events = 0
+        self.replies = 0
+        self.actions: dict = {}
+
+    def base_event(self, message_id: int, chat: tuple, text: str, message: list) -> dict:
+        user_id = 20000 + self.rng.randrange(200)
+        event = {
+            "time": int(time.time()),
+            "self_id": SELF_ID,
+            "post_type": "message",
+            "message_id": message_id,
+            "user_id": user_id,
+            "message": message,
+            "raw_message": text,
+            "font": 0,
+            "sender": {"user_id": user_id, "nickname": f"用户{user_id}", "card": ""},
+        }
+        if chat[0] == 'group':
+            event.update(message_type="group", sub_type="normal", group_id=chat[1])
+        else:
+            event.update(message_type="private", sub_type="friend", user_id=chat[1],
+                         sender={"user_id": chat[1], "nickname": f"用户{chat[1]}"})
+        return event
+
+    def make_event(self) -> dict:
+        message_id = next(self.ids)
+        if self.rng.random() < self.args.private_ratio:
+            chat = ('private', 30000 + self.rng.randrange(self.args.groups))
+        else:
+            chat = ('group', 40000 + self.rng.randrange(self.args.groups))
+
+        if self.rng.random() < self.args.command_ratio:
+            # 引用一张图片并发送图片识别命令
+            text = "+"
+            message = [{"type": "reply", "data": {"id": str(message_id)}}, {"type": "text", "data": {"text": text}}]
+            self.pending_commands[str(message_id)] = time.perf_counter()
+        else:
+            text = f"{self.rng.choice(TEXTS)} #{message_id}"
+            message = [{"type": "text", "data": {"text": text}}]
+            self.sent_at[str(message_id)] = time.perf_counter()
+        return self.base_event(message_id, chat, text, message)
+
+    async def handle_action(self, payload: dict) -> None:
+        action, params, echo = payload.get("action"), payload.get("params", {}), payload.get("echo")
+        self.actions[action] = self.actions.get(action, 0) + 1
+        data = None
+
+        if action in ("send_msg", "send_group_msg", "send_private_msg"):
+            self.record_reply(params)
+            data = {"message_id": next(self.ids)}
+        elif action == "get_msg":
+            image_url = f"http://{self.args.mock_host}:{self.args.mock_port}/img/{params.get('message_id')}.jpg"
+            data = {
+                "time": int(time.time()),
+                "message_type": "group",
+                "message_id": params.get("message_id"),
+                "real_id": params.get("message_id"),
+                "sender": {"user_id": 20000, "nickname": "用户20000"},
+                "message": [{"type": "image", "data": {"file": "mock.jpg", "url": image_url}}],
+            }
+        elif action in ("get_group_msg_history", "get_friend_msg_history"):
+            data = {"messages": []}
+        elif action == "get_login_info":
+            data = {"user_id": SELF_ID, "nickname": "mock"}
+
+        await self.ws.send_str(json.dumps({"status": "ok", "retcode": 0, "data": data, "echo": echo}))
+
+    def record_reply(self, params: dict) -> None:
+        self.replies += 1
+        now = time.perf_counter()
+        text = message_text(params.get("message", ""))
+
+        for image_id in image_tag_re.findall(text):
+            if (sent := self.pending_commands.pop(image_id, None)) is not None:
+                self.vision_latencies.append(now - sent)
+        for marker in marker_re.findall(image_tag_re.sub('', text)):
+            if (sent := self.sent_at.pop(marker, None)) is not None:
+                self.chat_latencies.append(now - sent)
+
+    async def receive(self) -> None:
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            payload = json.loads(msg.data)
+            if "action" in payload:
+                asyncio.create_task(self.handle_action(payload))
+
+    async def replay(self) -> None:
+        interval = 1 / self.args.rate
+        start = time.perf_counter()
+        total = int(self.args.rate * self.args.duration)
+        for idx in range(total):
+            # 按绝对时间调度, 避免发送耗时累积导致实际速率偏低
+            delay = start + idx * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.ws.send_str(json.dumps(self.make_event(), ensure_ascii=False))
+            self.events += 1
+
+    async def connect(self, session: aiohttp.ClientSession) -> None:
+        headers = {"X-Self-ID": str(SELF_ID), "X-Client-Role": "Universal"}
+        if self.args.access_token:
+            headers["Authorization"] = f"Bearer {self.args.access_token}"
+        self.ws = await session.ws_connect(self.args.ws_url, headers=headers, max_msg_size=0)
+        await self.ws.send_str(json.dumps({"time": int(time.time()), "self_id": SELF_ID, "post_type": "meta_event",
+                                           "meta_event_type": "lifecycle", "sub_type": "connect"}))
+
+
+async def scrape(session: aiohttp.ClientSession, url: str) -> dict:
+    try:
+        async with session.get(url) as response:
+            return parse_metrics(await response.text())
+    except aiohttp.ClientError:
+        return {}
+
+
+async def sample_lag(session: aiohttp.ClientSession, url: str, samples: list, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        metrics = await scrape(session, url)
+        if "event_loop_lag_max_seconds" in metrics:
+            samples.append(metrics["event_loop_lag_max_seconds"])
+
+
+def report(bot: FakeOneBot, elapsed: float, before: dict, after: dict, lag: list, upstream: dict) -> None:
+    processed = after.get("fake_person_decisions_total", 0) - before.get("fake_person_decisions_total", 0)
+    print(f"\n发送事件 {bot.events} 条, 用时 {elapsed:.1f}s, {bot.events / elapsed:.1f} events/s")
+    if after:
+        print(f"机器人处理 {processed:.0f} 条, {processed / elapsed:.1f} events/s")
+    else:
+        print("无法读取机器人 /metrics, 处理速率与事件循环延迟不可用")
+    print(f"收到回复 {bot.replies} 条, 接口调用: {bot.actions}")
+    print(f"上游请求: {upstream}")
+
+    for name, values in (("伪人回复", bot.chat_latencies), ("图片识别", bot.vision_latencies)):
+        if values:
+            print(f"{name}延迟 (s): n={len(values)} p50={percentile(values, 0.5):.3f} "
+                  f"p90={percentile(values, 0.9):.3f} p99={percentile(values, 0.99):.3f} max={max(values):.3f}")
+        else:
+            print(f"{name}: 没有收到回复")
+    if lag:
+        print(f"事件循环延迟 (s): p50={percentile(lag, 0.5):.4f} p99={percentile(lag, 0.99):.4f} max={max(lag):.4f}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    runner = None
+    if not args.external_mocks:
+        runner = await mock_servers.start(mock_servers.config_from_args(args), args.mock_host, args.mock_port)
+
+    bot = FakeOneBot(args)
+    lag: list = []
+    async with aiohttp.ClientSession() as session:
+        before = await scrape(session, args.metrics_url)
+        await bot.connect(session)
+        receiver = asyncio.create_task(bot.receive())
+        sampler = asyncio.create_task(sample_lag(session, args.metrics_url, lag, 1.0))
+
+        start = time.perf_counter()
+        await bot.replay()
+        elapsed = time.perf_counter() - start
+        # 等待进行中的回复
+        await asyncio.sleep(args.drain)
+
+        after = await scrape(session, args.metrics_url)
+        sampler.cancel()
+        receiver.cancel()
+        await bot.ws.close()
+
+    upstream = runner.app["stats"] if runner is not None else {}
+    if runner is not None:
+        await runner.cleanup()
+    report(bot, elapsed, before, after, lag, upstream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ws-url', default='ws://127.0.0.1:8080/onebot/v11/ws')
+    parser.add_argument('--metrics-url', default='http://127.0.0.1:8080/metrics')
+    parser.add_argument('--access-token', default='')
+    parser.add_argument('--rate', type=float, default=50, help="每秒发送的事件数")
+    parser.add_argument('--duration', type=float, default=60, help="发送时长 (秒)")
+    parser.add_argument('--drain', type=float, default=15, help="发送结束后继续等待回复的时间 (秒)")
+    parser.add_argument('--groups', type=int, default=20, help="会话数")
+    parser.add_argument('--private-ratio', type=float, default=0.1, help="私聊消息的比例")
+    parser.add_argument('--command-ratio', type=float, default=0.05, help="图片识别命令的比例")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--external-mocks', action='store_true', help="模拟服务已单独启动, 不在本进程启动")
+    mock_servers.add_arguments(parser)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+MessageQueue / MessageQueueManager 基准: 10k 个群, 每群 MaxQueueSize 条消息
+
+对比旧实现 (dict + list 环形缓冲区, 管理器不淘汰) 与当前实现的写入、顺序读取耗时及内存。
+
+用法: python -m benchmarks.message_queue
+"""
+import time
+import tracemalloc
+
+from utils.MessageQueue import MessageQueueManager
+
+GROUPS = 10_000
+QUEUE_SIZE = 50
+# 每群写入 2 倍容量的消息, 覆盖环形缓冲区写满后的淘汰路径。
+# 旧实现写满后仍会向 order 追加, 第 2 * size + 1 条消息会删除已删除的 ID 并抛出 KeyError, 因此不能写得更多
+MESSAGES_PER_GROUP = QUEUE_SIZE * 2
+
+
+class LegacyMessageQueue:
+    def __init__(self, size: int):
+        self.size = size
+        self.buffer = {}
+        self.order = []
+        self.head = 0
+        self.tail = 0
+        self.count = 0
+
+    def add_message(self, message_id: str, _message: str) -> str:
+        if message_id in self.buffer:
+            self.buffer[message_id] = _message
+        else:
+            if self.count < self.size:
+                self.count += 1
+            else:
+                oldest_id = self.order[self.head]
+                del self.buffer[oldest_id]
+                self.head = (self.head + 1) % self.size
+
+            self.buffer[message_id] = _message
+            if self.count <= self.size:
+                self.order.append(message_id)
+            else:
+                self.order[self.tail] = message_id
+            self.tail = (self.tail + 1) % self.size
+
+        return message_id
+
+    def get_all_messages(self):
+        messages = []
+        index = self.head
+        for _ in range(self.count):
+            message_id = self.order[index]
+            if message_id in self.buffer:
+                messages.append((message_id, self.buffer[message_id]))
+            index = (index + 1) % self.size
+        return messages
+
+
+def run(make_get_queue) -> dict:
+    """
+    make_get_queue() 返回一个全新的 get_queue(group) 函数, 模拟插件中按群号取队列的用法。
+    耗时与内存分两轮测量, 避免 tracemalloc 的开销影响计时。
+    """
+    result = {}
+    for traced in (False, True):
+        get_queue = make_get_queue()
+        if traced:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        for i in range(MESSAGES_PER_GROUP):
+            message = f"Message {i}"
+            for group in range(GROUPS):
+                get_queue(group).add_message(f"{group}:{i}", message)
+        add_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for group in range(GROUPS):
+            get_queue(group).get_all_messages()
+        read_time = time.perf_counter() - start
+
+        if traced:
+            result["memory"], _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            result["add"], result["read"] = add_time, read_time
+    return result
+
+
+def legacy_factory():
+    queues = {}
+
+    def get_queue(group):
+        queue = queues.get(group)
+        if queue is None:
+            queue = queues[group] = LegacyMessageQueue(QUEUE_SIZE)
+        return queue
+
+    return get_queue
+
+
+def manager_factory(managers: list, max_bytes: int = 0):
+    def make():
+        manager = MessageQueueManager(max_bytes=max_bytes)
+        managers.append(manager)
+        return lambda group: manager.get_or_create_queue(group, QUEUE_SIZE)
+
+    return make
+
+
+def main():
+    total = GROUPS * MESSAGES_PER_GROUP
+    print(f"{GROUPS} groups x {MESSAGES_PER_GROUP} messages (queue size {QUEUE_SIZE})")
+
+    budget = 16 * 1024 * 1024
+    budget_managers = []
+    results = {
+        "legacy": run(legacy_factory),
+        "current": run(manager_factory([])),
+        "budget": run(manager_factory(budget_managers, budget)),
+    }
+
+    print(f"{'impl':>8} {'add(ns/op)':>12} {'read(ms)':>10} {'memory(MB)':>12}")
+    for name, result in results.items():
+        print(f"{name:>8} {result['add'] / total * 1e9:>12.0f} {result['read'] * 1e3:>10.1f} "
+              f"{result['memory'] / 2 ** 20:>12.1f}")
+
+    manager = budget_managers[-1]
+    print(f"budget {budget / 2 ** 20:.0f}MB: {len(manager)} queues kept, "
+          f"{manager.evictions} evictions, {manager.total_bytes / 2 ** 20:.1f}MB accounted")
+
+
+if __name__ == '__main__':
+    main()
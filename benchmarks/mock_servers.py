@@ -0,0 +1,247 @@
+"""
+本地模拟上游服务, 用于离线压测
+
+在一个端口上同时提供:
+  POST /v1/chat/completions                         OpenAI chat/completions, 支持 stream (SSE)
+  POST /v1beta/models/{model}:generateContent       Gemini
+  POST /client/v4/accounts/{id}/ai/run/{model}      Cloudflare Workers AI
+  GET  /img/{id}.jpg                                图片下载
+
+模型回复会带上 prompt 中最后一个 "#数字" 标记, 压测端据此把回复与触发它的消息对应起来, 计算回复延迟。
+每个图片 id 返回不同的图片, 图片顶部的黑白色块编码了 id; 图片描述会带上从收到的图片中读出的 "[img:id]" 标记。
+各服务的延迟可以分别配置, 并叠加 ±jitter 的随机抖动。
+
+用法: python -m benchmarks.mock_servers [--port 9000] [--llm-latency 0.8] [--print-config]
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import io
+import json
+import random
+import re
+
+from aiohttp import web
+
+marker_re = re.compile(r'#(\d+)')
+image_name_re = re.compile(r'(\d+)')
+
+# 图片顶部用多少个黑白色块编码图片 id, 缩放到 512 宽并重新压缩后仍能可靠读出
+ID_BITS = 24
+
+REPLY = "这是模拟的回复#{marker}。今天天气真不错！你们在聊什么呢？哈哈哈"
+
+
+class MockConfig:
+    """
+    模拟服务的延迟配置 (秒)
+    """
+
+    def __init__(self, llm_latency: float = 0.8, token_interval: float = 0.02, gemini_latency: float = 1.0,
+                 cloudflare_latency: float = 1.5, image_latency: float = 0.05, jitter: float = 0.2,
+                 error_rate: float = 0.0):
+        self.llm_latency = llm_latency
+        self.token_interval = token_interval
+        self.gemini_latency = gemini_latency
+        self.cloudflare_latency = cloudflare_latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self, base: float) -> float:
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+@functools.lru_cache(maxsize=256)
+def make_image(image_id: int, width: int = 1280, height: int = 960) -> bytes:
+    """
+    生成一张 JPEG 样例图片, 顶部一行色块按二进制编码 image_id。
+    没有 PIL 时返回以 image_id 为种子的随机字节 (只能用于 Cloudflare 路径)
+    """
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return random.Random(image_id).randbytes(200 * 1024)
+
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for bit in range(ID_BITS):
+        color = (255, 255, 255) if image_id >> bit & 1 else (0, 0, 0)
+        draw.rectangle((bit * width // ID_BITS, 0, (bit + 1) * width // ID_BITS - 1, height // 8), fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def read_image_id(data: bytes, served: dict) -> int | None:
+    """
+    找出收到的图片对应的 id: 原样转发的图片 (Cloudflare) 按内容哈希查找,
+    缩放并重新压缩过的图片 (Gemini) 解码后读取顶部色块
+    """
+    if (image_id := served.get(hashlib.sha1(data).digest())) is not None:
+        return image_id
+    try:
+        from PIL import Image
+        image = Image.open(io.BytesIO(data)).convert('L')
+    except Exception:
+        return None
+
+    y = image.height // 16
+    return sum(1 << bit for bit in range(ID_BITS)
+               if image.getpixel(((2 * bit + 1) * image.width // (2 * ID_BITS), y)) > 127)
+
+
+def find_inline_data(node) -> str | None:
+    """
+    在 Gemini 请求体中找到 inline_data.data (base64 图片)
+    """
+    if isinstance(node, dict):
+        if isinstance(node.get("inline_data"), dict):
+            return node["inline_data"].get("data")
+        node = list(node.values())
+    if isinstance(node, list):
+        for item in node:
+            if (data := find_inline_data(item)) is not None:
+                return data
+    return None
+
+
+def describe(image_id: int | None, provider: str) -> str:
+    tag = f"[img:{image_id}]" if image_id is not None else ""
+    return f"一张渐变色的图片{tag} ({provider})"
+
+
+def find_marker(body: dict) -> str:
+    text = ''.join(str(message.get("content", "")) for message in body.get("messages", []))
+    markers = marker_re.findall(text)
+    return markers[-1] if markers else "0"
+
+
+def create_app(config: MockConfig) -> web.Application:
+    # 已提供的图片内容哈希 -> 图片 id
+    served: dict = {}
+    stats = {"openai": 0, "gemini": 0, "cloudflare": 0, "image": 0}
+
+    async def chat_completions(request: web.Request) -> web.StreamResponse:
+        stats["openai"] += 1
+        body = await request.json()
+        reply = REPLY.format(marker=find_marker(body))
+        await asyncio.sleep(config.delay(config.llm_latency))
+        if random.random() < config.error_rate:
+            return web.json_response({"error": {"message": "mock error"}}, status=500)
+
+        if not body.get("stream"):
+            # 与 OpenAIAPI.call_openai_api 解析的响应结构一致
+            content = [{"type": "thinking", "thinking": ""}, {"type": "text", "text": {"content": reply}}]
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for idx in range(0, len(reply), 2):
+            chunk = {"choices": [{"delta": {"content": reply[idx:idx + 2]}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            await asyncio.sleep(config.delay(config.token_interval))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def gemini(request: web.Request) -> web.Response:
+        stats["gemini"] += 1
+        data = find_inline_data(await request.json())
+        image_id = read_image_id(base64.b64decode(data), served) if data else None
+        await asyncio.sleep(config.delay(config.gemini_latency))
+        if random.random() < config.error_rate:
+            return web.json_response({"error": {"message": "mock error"}}, status=500)
+        text = describe(image_id, "gemini")
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def cloudflare(request: web.Request) -> web.Response:
+        stats["cloudflare"] += 1
+        image = (await request.json()).get("image")
+        # 图片可能是 base64 字符串, 也可能是旧格式的整数数组
+        data = base64.b64decode(image) if isinstance(image, str) else bytes(image or b'')
+        image_id = read_image_id(data, served) if data else None
+        await asyncio.sleep(config.delay(config.cloudflare_latency))
+        if random.random() < config.error_rate:
+            return web.json_response({"success": False, "errors": [{"message": "mock error"}]}, status=500)
+        return web.json_response({"success": True, "result": {"description": describe(image_id, "cloudflare")}})
+
+    async def image_file(request: web.Request) -> web.Response:
+        stats["image"] += 1
+        match = image_name_re.search(request.match_info["name"])
+        image_id = int(match.group(1)) if match else 0
+        image = make_image(image_id)
+        served[hashlib.sha1(image).digest()] = image_id
+        await asyncio.sleep(config.delay(config.image_latency))
+        return web.Response(body=image, content_type='image/jpeg')
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["stats"] = stats
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_post('/v1beta/models/{model}', gemini)
+    app.router.add_post('/client/v4/accounts/{account}/ai/run/{model:.+}', cloudflare)
+    app.router.add_get('/img/{name}', image_file)
+    return app
+
+
+async def start(config: MockConfig, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(create_app(config), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def bot_config(host: str, port: int) -> dict:
+    """
+    让机器人使用模拟服务需要修改的 config.jsonc 配置
+    """
+    return {
+        "OpenAI": {"Https": False, "BaseUrl": f"{host}:{port}", "APIKey": "mock", "CacheSize": 0},
+        "Google": {"ENABLE": True, "APIKey": "mock", "BaseUrl": f"http://{host}:{port}"},
+        "Cloudflare": {"ENABLE": True, "AccountID": "mock", "APIKey": "mock", "BaseUrl": f"http://{host}:{port}"},
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--mock-host', default='127.0.0.1')
+    parser.add_argument('--mock-port', type=int, default=9000)
+    parser.add_argument('--llm-latency', type=float, default=0.8, help="模型首字延迟 (秒)")
+    parser.add_argument('--token-interval', type=float, default=0.02, help="流式响应每段增量的间隔 (秒)")
+    parser.add_argument('--gemini-latency', type=float, default=1.0)
+    parser.add_argument('--cloudflare-latency', type=float, default=1.5)
+    parser.add_argument('--image-latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.2, help="延迟的相对抖动幅度")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟服务返回错误的比例")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(llm_latency=args.llm_latency, token_interval=args.token_interval,
+                      gemini_latency=args.gemini_latency, cloudflare_latency=args.cloudflare_latency,
+                      image_latency=args.image_latency, jitter=args.jitter, error_rate=args.error_rate)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    await start(config_from_args(args), args.mock_host, args.mock_port)
+    print(f"模拟服务已启动: http://{args.mock_host}:{args.mock_port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--print-config', action='store_true', help="输出需要合并到 config.jsonc 的配置后退出")
+    args = parser.parse_args()
+
+    if args.print_config:
+        print(json.dumps(bot_config(args.mock_host, args.mock_port), indent=4, ensure_ascii=False))
+        return
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env sh
+# 运行基准测试并与显式保存的基线比较
+#
+# 用法:
+#   benchmarks/run.sh            运行并与基线比较, 任一用例平均耗时比基线慢 15% 以上时失败; 本次结果不保存
+#   benchmarks/run.sh --save     运行并保存为新的基线 (替换旧基线), 不比较
+#   THRESHOLD=25% benchmarks/run.sh   调整允许的退化幅度
+#   BASELINE=before-refactor benchmarks/run.sh --save   使用其他名称的基线
+#
+# 结果保存在 benchmarks/.results, 同一台机器上的结果才有可比性。
+# 每次都与同一个基线比较, 退化的结果不会成为下一次比较的对象, 多次小幅退化也会累积到阈值而失败。
+set -e
+cd "$(dirname "$0")/.."
+
+BASELINE="${BASELINE:-baseline}"
+
+if [ "$1" = "--save" ]; then
+    shift
+    rm -f benchmarks/.results/*/*_"$BASELINE".json
+    exec python -m pytest benchmarks --benchmark-save="$BASELINE" "$@"
+fi
+
+if ls benchmarks/.results/*/*_"$BASELINE".json >/dev/null 2>&1; then
+    exec python -m pytest benchmarks --benchmark-compare="$BASELINE" \
+        --benchmark-compare-fail="mean:${THRESHOLD:-15%}" "$@"
+fi
+
+echo "没有已保存的基线 $BASELINE, 本次结果将作为基线"
+exec python -m pytest benchmarks --benchmark-save="$BASELINE" "$@"
@@ -0,0 +1,75 @@
+"""
+流式响应分句的微基准
+
+对比旧实现 (累积完整响应 + 按 last_position 切片 + 每次从头扫描缓冲区) 与
+ResponseReader.feed 的增量实现。增量实现的 "每字符耗时" 应当不随响应长度增长。
+
+用法: python -m benchmarks.stream_reader
+"""
+import time
+
+from utils.api.OpenAI import ResponseReader
+
+# 模拟模型输出: 长段落中偶尔出现句末标点, 每个 token 约 2 个字符
+SENTENCE = "这是一段没有标点的很长的模型输出内容" * 20 + "。"
+DELTA_SIZE = 2
+
+
+def make_deltas(total_chars: int) -> list[str]:
+    text = (SENTENCE * (total_chars // len(SENTENCE) + 1))[:total_chars]
+    return [text[i:i + DELTA_SIZE] for i in range(0, len(text), DELTA_SIZE)]
+
+
+def legacy_pipeline(deltas: list[str]) -> int:
+    # call_openai_api_stream 旧逻辑: 每个 token 产出完整的累积响应
+    full_response = ""
+    last_position = 0
+    collected_content = ""
+    end_chars = ['。', '！', '？', '.', '?', '!']
+    count = 0
+
+    for delta in deltas:
+        full_response += delta
+        # ResponseReader.read 旧逻辑, 读取方持有累积响应的引用
+        current_response = full_response
+        new_content = current_response[last_position:]
+        last_position = len(current_response)
+        # ResponseReader.get_sentences 旧逻辑
+        collected_content += new_content
+        start = 0
+        for idx, char in enumerate(collected_content):
+            if char in end_chars:
+                count += 1
+                start = idx + 1
+        collected_content = collected_content[start:]
+    return count
+
+
+def incremental_pipeline(deltas: list[str]) -> int:
+    reader = ResponseReader(None)
+    count = 0
+    for delta in deltas:
+        count += len(reader.feed(delta))
+    if reader.flush():
+        count += 1
+    return count
+
+
+def measure(func, deltas: list[str]) -> float:
+    start = time.perf_counter()
+    func(deltas)
+    return time.perf_counter() - start
+
+
+def main():
+    print(f"{'chars':>8} {'legacy(ms)':>12} {'ns/char':>10} {'incremental(ms)':>16} {'ns/char':>10}")
+    for total_chars in (2_000, 8_000, 32_000, 128_000):
+        deltas = make_deltas(total_chars)
+        legacy = measure(legacy_pipeline, deltas)
+        incremental = measure(incremental_pipeline, deltas)
+        print(f"{total_chars:>8} {legacy * 1e3:>12.2f} {legacy / total_chars * 1e9:>10.1f} "
+              f"{incremental * 1e3:>16.2f} {incremental / total_chars * 1e9:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
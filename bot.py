@@ -1,48 +1,113 @@
 import asyncio
 import random
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 
 import nonebot
 from nonebot.adapters.onebot.v11 import Adapter as ONEBOT_V11Adapter
 from nonebot.log import logger
 
 from core.ConfigProvider import ConfigProvider
+from utils.api.HttpPool import HttpPool
+from utils.ImageCache import ImageCacheManager
+from utils.Logging import Logging
 from utils.SentencesSpliter import SentencesSpliterManager
 from utils.Weather import Weather
 
+# 获取随机数种子的时限 (秒), 超时后使用缓存或本地种子
+SEED_TIMEOUT = 5
 
-#  logger.add("trace.log", level="TRACE", format=default_format)
-#  输出日志到文件谨慎开启，image2text的日志非超多，不一会就能写出几百MB
-async def load_config():
-    config_provider = ConfigProvider.get_instance()
-    config_provider.load_config()
+# 启动各阶段耗时 (秒)
+phases: dict = {}
+started_at = time.perf_counter()
+# 后台完成启动的任务, 保留引用避免被回收, 关闭时取消
+startup_task: asyncio.Task | None = None
 
 
-async def main():
-    tasks = []
+@contextmanager
+def phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = time.perf_counter() - start
 
-    logger.info("开始获取随机数种子...")
-    tasks.append(Weather.get_ticket())
 
-    logger.info("加载配置文件...")
-    tasks.append(asyncio.create_task(load_config()))
+def report() -> None:
+    total = time.perf_counter() - started_at
+    lines = '\n'.join(f"  {name:<12}{seconds * 1000:>10.1f} ms" for name, seconds in phases.items())
+    logger.info(f"启动耗时 {total * 1000:.1f} ms:\n{lines}")
 
-    await asyncio.gather(*tasks)
-    random.seed(await Weather.get_seed())
-
-    logger.info("启动...")
 
+async def seed_random() -> None:
+    with phase("seed"):
+        seed, source = await Weather.fetch_seed(SEED_TIMEOUT)
+        random.seed(seed)
+    logger.info(f"随机数种子已设置 (来源: {source})")
 
-if __name__ == "__main__":
-    asyncio.run(main())
 
-    logger.info("加载分句器模型...")
-    if SentencesSpliterManager.initialize_model():
+async def wait_model(future: Future) -> None:
+    start = time.perf_counter()
+    try:
+        loaded = await asyncio.wrap_future(future)
+    except Exception as e:
+        logger.error(f"分句器模型加载失败: {e}")
+        loaded = False
+    # 模型在启动最开始就已提交加载, 这里记录的是之后还需等待的时间
+    phases["spacy(wait)"] = time.perf_counter() - start
+    if loaded:
         logger.info("分句器模型加载成功！")
 
-    nonebot.init()
 
-    driver = nonebot.get_driver()
-    driver.register_adapter(ONEBOT_V11Adapter)
+async def finish_startup(model_future: Future) -> None:
+    try:
+        await asyncio.gather(seed_random(), wait_model(model_future))
+    except Exception as e:
+        logger.error(f"启动后台任务失败: {e}")
+    report()
+
 
-    nonebot.load_plugins("plugins")
+if __name__ == "__main__":
+    with phase("config"):
+        logger.info("加载配置文件...")
+        ConfigProvider.get_instance()
+        # 日志文件、轮转、采样与截断由 config.jsonc 的 Log 配置控制
+        Logging.setup()
+
+    # 分句器模型在子进程中加载, 与后续的驱动初始化并行
+    logger.info("加载分句器模型...")
+    with phase("spacy"):
+        model_future = SentencesSpliterManager.preload_model()
+
+    async def startup() -> None:
+        """
+        驱动启动后在后台设置种子并等待分句器模型, 不阻塞 OneBot 连接。
+        """
+        global startup_task
+        phases["ready"] = time.perf_counter() - started_at
+        startup_task = asyncio.create_task(finish_startup(model_future))
+
+    async def shutdown() -> None:
+        if startup_task is not None:
+            startup_task.cancel()
+
+    with phase("nonebot"):
+        nonebot.init()
+
+        driver = nonebot.get_driver()
+        driver.register_adapter(ONEBOT_V11Adapter)
+        driver.on_startup(HttpPool.startup)
+        driver.on_shutdown(HttpPool.shutdown)
+        driver.on_startup(ImageCacheManager.load)
+        driver.on_startup(ConfigProvider.startup)
+        driver.on_shutdown(ConfigProvider.shutdown)
+        driver.on_shutdown(Logging.shutdown)
+        driver.on_startup(startup)
+        driver.on_shutdown(shutdown)
+
+    with phase("plugins"):
+        nonebot.load_plugins("plugins")
+
+    logger.info("启动...")
     nonebot.run()
@@ -1,9 +1,13 @@
+import asyncio
+import contextlib
 import json
 import os
 import re
-from typing import Union
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Union
 
-import aiofiles
+from nonebot.log import logger
 
 comment_re = re.compile(r'(?<!\\)//.*?$|/\*(\s|\S)*?\*/', re.MULTILINE)
 
@@ -13,26 +17,100 @@ class OpenAI:
     APIKey: Union[str, None] = None
     MODEL: Union[str, None] = "gpt-3.5-turbo"
     BaseUrl: Union[str, None] = None
+    MaxTokens: int = 1000
+    MaxConcurrency: int = 4
+    RequestsPerMinute: int = 60
+    TokensPerMinute: int = 90000
+    CacheSize: int = 256
+    CacheTTL: int = 300
+    ContextTokens: int = 2000
 
 
 class Spacy:
     ENABLE: bool = True
     MODEL: Union[str, None] = None
+    Workers: int = 1
+    RuleMaxLength: int = 200
+    BatchWindow: float = 0.01
+    BatchSize: int = 16
 
 
 class MessageQueue:
     MaxQueueSize: Union[int, None] = None
+    MaxBytes: int = 64 * 1024 * 1024
 
 
 class Cloudflare:
     ENABLE: bool = True
     AccountID: Union[str, None] = None
     APIKey: Union[str, None] = None
+    MaxImageBytes: int = 10 * 1024 * 1024
+    ImageEncoding: str = "array"
+    BaseUrl: str = "https://api.cloudflare.com"
 
 
 class Google:
     ENABLE: bool = True
     APIKey: Union[str, None] = None
+    ResultTTL: int = 60
+    ImageWorkers: int = 2
+    BaseUrl: str = "https://generativelanguage.googleapis.com"
+
+
+class Http:
+    Limit: int = 100
+    LimitPerHost: int = 10
+    KeepAliveTimeout: int = 30
+    ConnectTimeout: int = 10
+
+
+class Vision:
+    Timeout: int = 30
+    Hedge: bool = True
+    HedgeDelay: float = 3.0
+    Window: int = 50
+    BreakerFailures: int = 3
+    BreakerCooldown: int = 60
+
+
+class ImageCache:
+    Dir: str = "cache/imgs"
+    MaxBytes: int = 256 * 1024 * 1024
+    MaxUrls: int = 4096
+
+
+class FakePerson:
+    Stream: bool = False
+    HistoryContext: bool = False
+    Probability: float = 0.2
+    Cooldown: float = 10
+    TargetPerMinute: float = 1.0
+    GroupPerMinute: float = 2
+    GlobalPerMinute: float = 10
+    MaxGroups: int = 1024
+
+
+class Sender:
+    CharsPerSecond: float = 8
+    MaxTypingDelay: float = 3.0
+    PerMinute: int = 20
+    MergeLength: int = 8
+
+
+class Log:
+    File: str = "logs/bot.log"
+    Level: str = "INFO"
+    ConsoleLevel: str = "INFO"
+    Rotation: str = "50 MB"
+    Retention: int = 5
+    Compression: str = "gz"
+    MaxLength: int = 2000
+    Sampling: dict = {"message": 0.05}
+
+
+class HotReload:
+    WatchInterval: int = 2
+    WriteDelay: float = 1.0
 
 
 class Bot:
@@ -60,16 +138,135 @@ def get_class_by_name(class_name: str):
             return Cloudflare
         case 'Google':
             return Google
+        case 'Http':
+            return Http
+        case 'FakePerson':
+            return FakePerson
+        case 'ImageCache':
+            return ImageCache
+        case 'Vision':
+            return Vision
+        case 'HotReload':
+            return HotReload
+        case 'Sender':
+            return Sender
+        case 'Log':
+            return Log
         case _:
             return None
 
 
+# 配置类名 -> 该类在快照中的只读类型 (namedtuple, 字段为类中声明的配置项)
+_section_types: dict = {}
+
+
+def _capture_section(class_name: str):
+    """
+    把配置类当前的属性值复制为只读的 namedtuple, 读取与普通属性一样快。
+    """
+    class_obj = get_class_by_name(class_name)
+    section_type = _section_types.get(class_name)
+    if section_type is None:
+        section_type = _section_types[class_name] = namedtuple(class_name, list(class_obj.__annotations__))
+    return section_type(*(getattr(class_obj, field) for field in section_type._fields))
+
+
+class ConfigSnapshot:
+    """
+    不可变的配置快照
+
+    每次重新加载或修改配置都会生成新的快照并整体替换 ConfigProvider.snapshot,
+    读取方拿到的快照不会再变化, 因此无需加锁。
+    热路径在每次操作开始时取一次快照, 之后通过 snapshot.OpenAI.MaxTokens 这样的属性读取,
+    同一次操作中读到的配置来自同一个版本, 即使中途 await 时配置被重新加载。
+
+    Parameters
+    ----------
+    version : int
+        快照版本号, 每次变更加 1。
+    data : dict
+        配置内容, 会被复制并包装为只读映射。
+    """
+    __slots__ = ('version', 'data', 'sections')
+
+    def __init__(self, version: int, data: dict):
+        self.version = version
+        self.data = MappingProxyType({
+            name: MappingProxyType(dict(section)) if isinstance(section, dict) else section
+            for name, section in data.items()
+        })
+        # 各配置类属性 (已应用默认值) 的只读副本
+        self.sections = {name: _capture_section(name) for name in ConfigProvider.VALID_CLASS_NAMES}
+
+    def __getattr__(self, name: str):
+        try:
+            return self.sections[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def section(self, name: str) -> Mapping:
+        return self.data.get(name, MappingProxyType({}))
+
+    def get(self, section: str, key: str, default: Any = None) -> Any:
+        return self.section(section).get(key, default)
+
+
+def _stat(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_config(path: str) -> tuple[tuple, dict]:
+    """
+    读取并解析 JSONC 配置文件, 返回 (文件状态, 配置内容)
+    """
+    stat = _stat(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        jsonc_data = f.read()
+
+    # remove comments
+    json_data = comment_re.sub('', jsonc_data)
+    return stat, json.loads(json_data)
+
+
+def _write_config(path: str, text: str) -> tuple:
+    """
+    先写入临时文件再替换, 保证配置文件不会出现写了一半的状态
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return _stat(path)
+
+
 class ConfigProvider:
     _instance = None
-    VALID_CLASS_NAMES: list = ['OpenAI', 'Spacy', 'MessageQueue', 'Cloudflare', 'Google']
+    VALID_CLASS_NAMES: list = ['OpenAI', 'Spacy', 'MessageQueue', 'Cloudflare', 'Google', 'Http', 'FakePerson',
+                               'ImageCache', 'Vision', 'HotReload', 'Sender', 'Log']
     VALID_ATTR_NAMES: list = ['Https', 'APIKey', 'MODEL', 'BaseUrl', 'ENABLE', 'MaxQueueSize', 'AccountID', 'AdminID',
-                              'IsCrossGroup']
+                              'IsCrossGroup', 'Limit', 'LimitPerHost', 'KeepAliveTimeout', 'ConnectTimeout', 'Workers',
+                              'Stream', 'MaxTokens', 'MaxConcurrency', 'RequestsPerMinute', 'TokensPerMinute',
+                              'CacheSize', 'CacheTTL', 'ResultTTL', 'Dir', 'MaxBytes', 'MaxUrls', 'MaxImageBytes',
+                              'ImageEncoding', 'ImageWorkers', 'Timeout', 'Hedge', 'HedgeDelay', 'Window',
+                              'BreakerFailures', 'BreakerCooldown', 'ContextTokens', 'HistoryContext',
+                              'WatchInterval', 'WriteDelay', 'RuleMaxLength', 'BatchWindow', 'BatchSize',
+                              'Probability', 'Cooldown', 'TargetPerMinute', 'GroupPerMinute', 'GlobalPerMinute',
+                              'MaxGroups', 'CharsPerSecond', 'MaxTypingDelay', 'PerMinute', 'MergeLength', 'File',
+                              'Level', 'ConsoleLevel', 'Rotation', 'Retention', 'Compression', 'MaxLength',
+                              'Sampling']
+    CONFIG_PATH: str = './config.jsonc'
     config: dict = {}
+    # 在类定义之后创建初始快照 (默认配置)
+    snapshot: ConfigSnapshot | None = None
+    subscribers: dict = {}
+    _loaded_stat: tuple | None = None
+    _write_handle: asyncio.TimerHandle | None = None
+    _watch_task: asyncio.Task | None = None
+    # 后台运行的协程订阅者与延迟写入, 保留引用避免被回收
+    _tasks: set = set()
 
     def __init__(self):
         for class_name in self.VALID_CLASS_NAMES:
@@ -84,44 +281,183 @@ class ConfigProvider:
         return cls._instance
 
     @classmethod
-    def load_config(cls):
-        if not os.path.exists('./config.jsonc'):
+    def load_config(cls, force: bool = False) -> bool:
+        """
+        加载配置文件。文件自上次加载后没有变化时直接跳过, 避免重复解析。
+
+        returns
+        -------
+        bool
+            是否重新加载了配置。
+        """
+        if not os.path.exists(cls.CONFIG_PATH):
             raise ConfigFileNotFoundException("Config file 'config.jsonc' not found")
 
         # if config.future exists, rename to config.jsonc
         if os.path.exists('./config.future'):
-            os.replace('./config.future', './config.jsonc')
+            os.replace('./config.future', cls.CONFIG_PATH)
+
+        if not force and _stat(cls.CONFIG_PATH) == cls._loaded_stat:
+            return False
+
+        stat, config = _read_config(cls.CONFIG_PATH)
+        cls._loaded_stat = stat
+        cls.apply(config)
+        return True
 
-        with open('./config.jsonc', 'r', encoding='utf-8') as f:
-            jsonc_data = f.read()
+    @classmethod
+    def apply(cls, config: dict) -> None:
+        """
+        应用新的配置: 更新各配置类的属性, 替换快照并通知发生变化的分区的订阅者。
+        整个过程中没有 await, 对其他协程来说是原子的。
+        配置不合法时抛出 ValueError, 各配置类的属性与快照保持原样。
+        """
+        for class_name in cls.VALID_CLASS_NAMES:
+            if not isinstance(config.setdefault(class_name, {}), dict):
+                raise ValueError(f"配置分区 {class_name} 必须是对象")
+
+        try:
+            cls._apply_attributes(config)
+        except Exception as e:
+            # 恢复为当前配置, 避免部分属性已经更新
+            cls._apply_attributes(cls.config)
+            raise ValueError(f"应用配置失败: {e}") from e
+        cls.config = config
+
+        old = cls.snapshot
+        cls.snapshot = ConfigSnapshot(old.version + 1, config)
+        cls._notify(old, cls.snapshot)
 
-        # remove comments
-        json_data = comment_re.sub('', jsonc_data)
-        cls.config = json.loads(json_data)
+    @classmethod
+    def subscribe(cls, section: str, callback: Callable[[Mapping, Mapping], Any]) -> None:
+        """
+        订阅某个配置分区的变化。
+
+        Parameters
+        ----------
+        section : str
+            分区名称, 例如 'OpenAI'。
+        callback : Callable[[Mapping, Mapping], Any]
+            以 (旧分区, 新分区) 调用, 可以是协程函数。
+        """
+        cls.subscribers.setdefault(section, []).append(callback)
 
-        # set class attributes
-        OpenAI.Https = cls.config.get('OpenAI', {}).get('Https', True)
-        OpenAI.APIKey = cls.config.get('OpenAI', {}).get('APIKey', None)
-        OpenAI.BaseUrl = cls.config.get('OpenAI', {}).get('BaseUrl', None)
-        OpenAI.MODEL = cls.config.get('OpenAI', {}).get('MODEL', "gpt-3.5-turbo")
+    @classmethod
+    def _notify(cls, old: ConfigSnapshot, new: ConfigSnapshot) -> None:
+        for section, callbacks in cls.subscribers.items():
+            old_section, new_section = old.section(section), new.section(section)
+            if old_section == new_section:
+                continue
+            for callback in callbacks:
+                # 单个订阅者出错不影响其他订阅者, 也不影响新配置生效
+                try:
+                    result = callback(old_section, new_section)
+                except Exception as e:
+                    logger.error(f"配置分区 {section} 的订阅者 {getattr(callback, '__name__', callback)} 出错: {e}")
+                    continue
+                if asyncio.iscoroutine(result):
+                    cls._spawn(result, f"配置分区 {section} 的订阅者")
+
+    @classmethod
+    def _spawn(cls, coro, name: str) -> asyncio.Task:
+        """
+        在后台运行协程, 保留任务引用, 出错时记录日志。
+        """
+        task = asyncio.ensure_future(coro)
+        cls._tasks.add(task)
+        task.add_done_callback(lambda done: cls._task_done(done, name))
+        return task
 
-        Spacy.ENABLE = cls.config.get('Spacy', {}).get('ENABLE', True)
+    @classmethod
+    def _task_done(cls, task: asyncio.Task, name: str) -> None:
+        cls._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"{name}出错: {task.exception()}")
+
+    @staticmethod
+    def _apply_attributes(config: dict) -> None:
+        OpenAI.Https = config.get('OpenAI', {}).get('Https', True)
+        OpenAI.APIKey = config.get('OpenAI', {}).get('APIKey', None)
+        OpenAI.BaseUrl = config.get('OpenAI', {}).get('BaseUrl', None)
+        OpenAI.MODEL = config.get('OpenAI', {}).get('MODEL', "gpt-3.5-turbo")
+        OpenAI.MaxTokens = config.get('OpenAI', {}).get('MaxTokens', 1000)
+        OpenAI.MaxConcurrency = config.get('OpenAI', {}).get('MaxConcurrency', 4)
+        OpenAI.RequestsPerMinute = config.get('OpenAI', {}).get('RequestsPerMinute', 60)
+        OpenAI.TokensPerMinute = config.get('OpenAI', {}).get('TokensPerMinute', 90000)
+        OpenAI.CacheSize = config.get('OpenAI', {}).get('CacheSize', 256)
+        OpenAI.CacheTTL = config.get('OpenAI', {}).get('CacheTTL', 300)
+        OpenAI.ContextTokens = config.get('OpenAI', {}).get('ContextTokens', 2000)
+
+        Spacy.ENABLE = config.get('Spacy', {}).get('ENABLE', True)
         if Spacy.ENABLE:
-            Spacy.MODEL = cls.config.get('Spacy', {}).get('MODEL', None)
+            Spacy.MODEL = config.get('Spacy', {}).get('MODEL', None)
+            Spacy.Workers = config.get('Spacy', {}).get('Workers', 1)
+            Spacy.RuleMaxLength = config.get('Spacy', {}).get('RuleMaxLength', 200)
+            Spacy.BatchWindow = config.get('Spacy', {}).get('BatchWindow', 0.01)
+            Spacy.BatchSize = config.get('Spacy', {}).get('BatchSize', 16)
 
-        MessageQueue.MaxQueueSize = cls.config.get('MessageQueue', {}).get('MaxQueueSize', 50)
+        MessageQueue.MaxQueueSize = config.get('MessageQueue', {}).get('MaxQueueSize', 50)
+        MessageQueue.MaxBytes = config.get('MessageQueue', {}).get('MaxBytes', 64 * 1024 * 1024)
 
-        Cloudflare.ENABLE = cls.config.get('Cloudflare', {}).get('ENABLE', True)
+        Cloudflare.ENABLE = config.get('Cloudflare', {}).get('ENABLE', True)
         if Cloudflare.ENABLE:
-            Cloudflare.AccountID = cls.config.get('Cloudflare', {}).get('AccountID', None)
-            Cloudflare.APIKey = cls.config.get('Cloudflare', {}).get('APIKey', None)
+            Cloudflare.AccountID = config.get('Cloudflare', {}).get('AccountID', None)
+            Cloudflare.APIKey = config.get('Cloudflare', {}).get('APIKey', None)
+            Cloudflare.MaxImageBytes = config.get('Cloudflare', {}).get('MaxImageBytes', 10 * 1024 * 1024)
+            Cloudflare.ImageEncoding = config.get('Cloudflare', {}).get('ImageEncoding', "array")
+            Cloudflare.BaseUrl = config.get('Cloudflare', {}).get('BaseUrl', "https://api.cloudflare.com")
 
-        Google.ENABLE = cls.config.get('Google', {}).get('ENABLE', True)
+        Google.ENABLE = config.get('Google', {}).get('ENABLE', True)
         if Google.ENABLE:
-            Google.APIKey = cls.config.get('Google', {}).get('APIKey', None)
-
-        Bot.AdminID = cls.config.get('Bot', {}).get('AdminID', None)
-        Bot.IsCrossGroup = cls.config.get('Bot', {}).get('IsCrossGroup', False)
+            Google.APIKey = config.get('Google', {}).get('APIKey', None)
+            Google.ResultTTL = config.get('Google', {}).get('ResultTTL', 60)
+            Google.ImageWorkers = config.get('Google', {}).get('ImageWorkers', 2)
+            Google.BaseUrl = config.get('Google', {}).get('BaseUrl', "https://generativelanguage.googleapis.com")
+
+        Http.Limit = config.get('Http', {}).get('Limit', 100)
+        Http.LimitPerHost = config.get('Http', {}).get('LimitPerHost', 10)
+        Http.KeepAliveTimeout = config.get('Http', {}).get('KeepAliveTimeout', 30)
+        Http.ConnectTimeout = config.get('Http', {}).get('ConnectTimeout', 10)
+
+        Vision.Timeout = config.get('Vision', {}).get('Timeout', 30)
+        Vision.Hedge = config.get('Vision', {}).get('Hedge', True)
+        Vision.HedgeDelay = config.get('Vision', {}).get('HedgeDelay', 3.0)
+        Vision.Window = config.get('Vision', {}).get('Window', 50)
+        Vision.BreakerFailures = config.get('Vision', {}).get('BreakerFailures', 3)
+        Vision.BreakerCooldown = config.get('Vision', {}).get('BreakerCooldown', 60)
+
+        ImageCache.Dir = config.get('ImageCache', {}).get('Dir', "cache/imgs")
+        ImageCache.MaxBytes = config.get('ImageCache', {}).get('MaxBytes', 256 * 1024 * 1024)
+        ImageCache.MaxUrls = config.get('ImageCache', {}).get('MaxUrls', 4096)
+
+        FakePerson.Stream = config.get('FakePerson', {}).get('Stream', False)
+        FakePerson.HistoryContext = config.get('FakePerson', {}).get('HistoryContext', False)
+        FakePerson.Probability = config.get('FakePerson', {}).get('Probability', 0.2)
+        FakePerson.Cooldown = config.get('FakePerson', {}).get('Cooldown', 10)
+        FakePerson.TargetPerMinute = config.get('FakePerson', {}).get('TargetPerMinute', 1.0)
+        FakePerson.GroupPerMinute = config.get('FakePerson', {}).get('GroupPerMinute', 2)
+        FakePerson.GlobalPerMinute = config.get('FakePerson', {}).get('GlobalPerMinute', 10)
+        FakePerson.MaxGroups = config.get('FakePerson', {}).get('MaxGroups', 1024)
+
+        Sender.CharsPerSecond = config.get('Sender', {}).get('CharsPerSecond', 8)
+        Sender.MaxTypingDelay = config.get('Sender', {}).get('MaxTypingDelay', 3.0)
+        Sender.PerMinute = config.get('Sender', {}).get('PerMinute', 20)
+        Sender.MergeLength = config.get('Sender', {}).get('MergeLength', 8)
+
+        Log.File = config.get('Log', {}).get('File', "logs/bot.log")
+        Log.Level = config.get('Log', {}).get('Level', "INFO")
+        Log.ConsoleLevel = config.get('Log', {}).get('ConsoleLevel', "INFO")
+        Log.Rotation = config.get('Log', {}).get('Rotation', "50 MB")
+        Log.Retention = config.get('Log', {}).get('Retention', 5)
+        Log.Compression = config.get('Log', {}).get('Compression', "gz")
+        Log.MaxLength = config.get('Log', {}).get('MaxLength', 2000)
+        Log.Sampling = config.get('Log', {}).get('Sampling', {"message": 0.05})
+
+        HotReload.WatchInterval = config.get('HotReload', {}).get('WatchInterval', 2)
+        HotReload.WriteDelay = config.get('HotReload', {}).get('WriteDelay', 1.0)
+
+        Bot.AdminID = config.get('Bot', {}).get('AdminID', None)
+        Bot.IsCrossGroup = config.get('Bot', {}).get('IsCrossGroup', False)
 
     @classmethod
     async def change_config(cls, class_name: str, key: str, value: Union[str, int, bool]) -> bool:
@@ -137,15 +473,84 @@ class ConfigProvider:
 
         # get type
         current_type = type(getattr(class_obj, key))
+        # 整数可以赋给浮点型属性, 例如 set FakePerson Probability 1;
+        # 按类型注解判断, 配置文件中写成整数的浮点型属性也能改为小数
+        if float in (current_type, getattr(class_obj, '__annotations__', {}).get(key)) and type(value) in (int, float):
+            value = float(value)
+            current_type = float
         new_type = type(value)
         if current_type != new_type:
             raise TypeError(f"Type mismatch: {current_type} != {new_type}")
 
-        # update config
+        # update config, 立即生效, 写入文件合并延迟进行
         setattr(class_obj, key, value)
-        cls.config[class_name][key] = value
+        cls.config.setdefault(class_name, {})[key] = value
 
-        async with aiofiles.open('./config.future', 'w', encoding='utf-8') as future_file:
-            await future_file.write(json.dumps(cls.config, indent=4))
+        old = cls.snapshot
+        cls.snapshot = ConfigSnapshot(old.version + 1, cls.config)
+        cls._notify(old, cls.snapshot)
+        cls._schedule_write()
 
         return True
+
+    @classmethod
+    def _schedule_write(cls) -> None:
+        """
+        在 HotReload.WriteDelay 秒后写入配置文件, 期间的多次修改只写一次。
+        """
+        if cls._write_handle is not None:
+            cls._write_handle.cancel()
+
+        loop = asyncio.get_running_loop()
+        cls._write_handle = loop.call_later(HotReload.WriteDelay, lambda: cls._spawn(cls.flush(), "写入配置文件"))
+
+    @classmethod
+    async def flush(cls) -> None:
+        """
+        立即把当前配置写入文件。
+        """
+        if cls._write_handle is not None:
+            cls._write_handle.cancel()
+            cls._write_handle = None
+
+        text = json.dumps(cls.config, indent=4, ensure_ascii=False)
+        cls._loaded_stat = await asyncio.to_thread(_write_config, cls.CONFIG_PATH, text)
+        logger.info(f"配置已写入 {cls.CONFIG_PATH}, 版本 {cls.snapshot.version}")
+
+    @classmethod
+    async def watch(cls) -> None:
+        """
+        每隔 HotReload.WatchInterval 秒检查配置文件, 变化后在线程中解析并应用。
+        """
+        while True:
+            await asyncio.sleep(HotReload.WatchInterval)
+            try:
+                if _stat(cls.CONFIG_PATH) == cls._loaded_stat:
+                    continue
+                stat, config = await asyncio.to_thread(_read_config, cls.CONFIG_PATH)
+                cls._loaded_stat = stat
+                cls.apply(config)
+            except Exception as e:
+                # 任何错误都不能结束监视任务, 否则之后的热重载全部失效
+                logger.error(f"重新加载配置失败, 继续使用版本 {cls.snapshot.version}: {e}")
+                with contextlib.suppress(OSError):
+                    cls._loaded_stat = _stat(cls.CONFIG_PATH)
+                continue
+
+            logger.info(f"配置文件已变化, 已重新加载, 版本 {cls.snapshot.version}")
+
+    @classmethod
+    async def startup(cls) -> None:
+        if cls._watch_task is None and HotReload.WatchInterval > 0:
+            cls._watch_task = asyncio.create_task(cls.watch())
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        if cls._watch_task is not None:
+            cls._watch_task.cancel()
+            cls._watch_task = None
+        if cls._write_handle is not None:
+            await cls.flush()
+
+
+ConfigProvider.snapshot = ConfigSnapshot(0, {})
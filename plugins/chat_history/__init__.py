@@ -0,0 +1,18 @@
+from nonebot import on_message
+from nonebot.adapters.onebot.v11 import GroupMessageEvent, PrivateMessageEvent
+from nonebot.plugin import PluginMetadata
+
+from utils.bot.history import ChatHistory
+
+__plugin_meta__ = PluginMetadata(
+    name="Chat History Plugin",
+    description="聊天记录插件",
+    usage=f"自动记录收到的消息, 供上下文使用",
+)
+
+recorder = on_message(priority=1, block=False)
+
+
+@recorder.handle()
+async def _(event: GroupMessageEvent | PrivateMessageEvent):
+    ChatHistory.record(event)
@@ -1,11 +1,16 @@
-import random
+import asyncio
 
 from nonebot import on_message
-from nonebot.adapters.onebot.v11 import GroupMessageEvent, PrivateMessageEvent
+from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, PrivateMessageEvent
 from nonebot.log import logger
 from nonebot.plugin import PluginMetadata
 
-from utils.api.OpenAI import OpenAIAPI
+from core.ConfigProvider import FakePerson, MessageQueue
+from utils.api.OpenAI import OpenAIAPI, ResponseReader
+from utils.bot.history import build_context, chat_key, get_history_messages
+from utils.bot.sender import OutboundSender, ReplyHandle
+from utils.bot.trigger import TriggerScheduler
+from utils.Logging import Logging
 from utils.SentencesSpliter import SentencesSpliterManager
 
 __plugin_meta__ = PluginMetadata(
@@ -17,25 +22,59 @@ __plugin_meta__ = PluginMetadata(
 fake_person = on_message(priority=15)
 
 
+# 正在生成的回复, 保留引用避免任务被回收
+replies: set = set()
+
+
+async def reply_stream(context: str, handle: ReplyHandle):
+    reader = ResponseReader(OpenAIAPI.call_openai_api_stream(context))
+
+    while (part := await reader.read()) is not None:
+        handle.extend(reader.feed(part))
+
+    # 剩余不以标点结尾的内容交给分句器
+    if (rest := reader.flush()).strip():
+        handle.extend(await SentencesSpliterManager.split_text(rest))
+
+
+async def reply(bot: Bot, event: GroupMessageEvent | PrivateMessageEvent, handle: ReplyHandle):
+    try:
+        context = event.get_plaintext()
+        if FakePerson.HistoryContext:
+            history = await get_history_messages(bot, event, MessageQueue.MaxQueueSize)
+            context = build_context(history) or context
+
+        if FakePerson.Stream:
+            await reply_stream(context, handle)
+            return
+
+        res = await OpenAIAPI.call_openai_api(context)
+        if res:
+            handle.extend(await SentencesSpliterManager.split_text(res))
+    except Exception as e:
+        logger.error(f"伪人回复失败: {e}")
+    finally:
+        handle.close()
+
+
 @fake_person.handle()
-async def _(event: GroupMessageEvent | PrivateMessageEvent):
+async def _(bot: Bot, event: GroupMessageEvent | PrivateMessageEvent):
+    # 每条消息都会记录, 按 Log.Sampling 中 message 的比例采样, 在格式化之前判断
     match event:
         case GroupMessageEvent():
-            logger.info(f"接收到群聊 {event.group_id} 成员: {event.user_id} 的消息")
+            if Logging.sampled("message"):
+                logger.info(f"接收到群聊 {event.group_id} 成员: {event.user_id} 的消息")
         case PrivateMessageEvent():
-            logger.info(f"接收到 {event.user_id} 的消息")
+            if Logging.sampled("message"):
+                logger.info(f"接收到 {event.user_id} 的消息")
         case _:
             return
 
-    rand = random.random()
-    logger.info(f"随机数: {rand}")
-
-    if rand <= 0.2:
+    key = chat_key(event)
+    if TriggerScheduler.should_trigger(key):
         logger.success("触发伪人")
-        res = await OpenAIAPI.call_openai_api(event.get_plaintext())
-        text = SentencesSpliterManager.split_text(res)
-
-        for _ in text:
-            if _.strip() == "":
-                continue
-            await fake_person.send(_)
+        # 先占住发送顺序, 生成与发送都在后台进行, matcher 立即返回
+        handle = OutboundSender.open(bot, event, key)
+        task = asyncio.create_task(reply(bot, event, handle))
+        replies.add(task)
+        task.add_done_callback(replies.discard)
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+from nonebot import get_driver
+from nonebot.drivers import URL, HTTPServerSetup, Request, Response, ReverseDriver
+from nonebot.log import logger
+from nonebot.plugin import PluginMetadata
+
+from utils.api.OpenAI import OpenAIAPI
+from utils.api.vision import GeminiFlash
+from utils.bot.history import ChatHistory
+from utils.bot.sender import OutboundSender
+from utils.bot.trigger import TriggerScheduler
+from utils.ImageCache import ImageCacheManager
+from utils.Metrics import Metrics
+from utils.SentencesSpliter import SentencesSpliterManager
+
+__plugin_meta__ = PluginMetadata(
+    name="Metrics Plugin",
+    description="运行指标插件",
+    usage=f"在驱动的 HTTP 服务上提供 GET /metrics (Prometheus 文本格式)",
+)
+
+# 事件循环延迟的采样间隔 (秒)
+LAG_INTERVAL = 0.5
+
+driver = get_driver()
+loop_lag = Metrics.gauge('event_loop_lag_seconds', "事件循环调度延迟 (秒), 即定时器实际唤醒时间与预期的差")
+loop_lag_max = Metrics.gauge('event_loop_lag_max_seconds', "自上次导出以来的最大事件循环调度延迟 (秒)")
+lag_task: asyncio.Task | None = None
+max_lag: float = 0.0
+
+
+def _executor_backlog(executor) -> int:
+    # ThreadPoolExecutor 没有公开排队任务数, 读取其内部队列; 其他实现或内部结构变化时记为 0
+    work_queue = getattr(executor, '_work_queue', None)
+    return work_queue.qsize() if work_queue is not None else 0
+
+
+def _register_gauges() -> None:
+    Metrics.gauge('chat_history_queues', "本地聊天记录中的会话数").set_function(lambda: len(ChatHistory.get_manager()))
+    Metrics.gauge('chat_history_bytes', "本地聊天记录估算占用的内存 (字节)").set_function(
+        lambda: ChatHistory.get_manager().total_bytes)
+    Metrics.gauge('chat_history_evictions', "本地聊天记录因内存上限淘汰的会话数").set_function(
+        lambda: ChatHistory.get_manager().evictions)
+
+    # OpenAI 回复缓存的命中数由 openai_cache_total 记录, 这里只导出已有统计的缓存
+    image_cache = Metrics.counter('image_cache_total', "图片缓存按 URL 查询次数", ('result',))
+    image_cache.set_function(lambda: ImageCacheManager.hits, ('hit',))
+    image_cache.set_function(lambda: ImageCacheManager.misses, ('miss',))
+    image_cache.set_function(lambda: ImageCacheManager.evictions, ('evicted',))
+    Metrics.gauge('openai_cache_entries', "OpenAI 回复缓存条目数").set_function(lambda: len(OpenAIAPI.get_cache()))
+    Metrics.gauge('image_cache_bytes', "图片磁盘缓存占用 (字节)").set_function(lambda: ImageCacheManager.total_bytes)
+
+    backlog = Metrics.gauge('executor_backlog', "线程池/进程池中排队或进行中的任务数", ('executor',))
+    backlog.set_function(lambda: _executor_backlog(GeminiFlash.executor), ('image',))
+    backlog.set_function(lambda: len(SentencesSpliterManager.pending), ('splitter_pending',))
+    backlog.set_function(lambda: SentencesSpliterManager.in_flight, ('splitter_in_flight',))
+
+    Metrics.gauge('outbound_chats', "有待发送消息的会话数").set_function(lambda: len(OutboundSender.chats))
+    Metrics.gauge('fake_person_chats', "保留触发状态的会话数").set_function(lambda: TriggerScheduler.stats()["chats"])
+
+
+def _take_max_lag() -> float:
+    global max_lag
+    value, max_lag = max_lag, 0.0
+    return value
+
+
+async def measure_loop_lag() -> None:
+    global max_lag
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag = max(0.0, time.perf_counter() - start - LAG_INTERVAL)
+        loop_lag.set(lag)
+        max_lag = max(max_lag, lag)
+
+
+async def metrics_handler(request: Request) -> Response:
+    return Response(200, headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+                    content=Metrics.render())
+
+
+@driver.on_startup
+async def _():
+    global lag_task
+    lag_task = asyncio.create_task(measure_loop_lag())
+
+
+@driver.on_shutdown
+async def _():
+    if lag_task is not None:
+        lag_task.cancel()
+
+
+_register_gauges()
+loop_lag_max.set_function(_take_max_lag)
+
+if isinstance(driver, ReverseDriver):
+    driver.setup_http_server(HTTPServerSetup(URL("/metrics"), "GET", "metrics", metrics_handler))
+else:
+    logger.warning("当前驱动不支持 HTTP 服务, /metrics 不可用")
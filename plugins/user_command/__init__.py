@@ -1,12 +1,9 @@
-import json
-
 from nonebot import on_command
 from nonebot.adapters.onebot.v11 import GroupMessageEvent, PrivateMessageEvent
 from nonebot.log import logger
 from nonebot.plugin import PluginMetadata
 
-from utils.api.vision.GeminiFlash import (download_image, process_image,
-                                          send_request)
+from utils.api.vision.Router import VisionError, VisionRouter
 
 __plugin_meta__ = PluginMetadata(
     name="User Command Plugin",
@@ -34,8 +31,10 @@ async def _(event: GroupMessageEvent | PrivateMessageEvent):
     if url == "":
         await vision.finish("没有找到图片, 可能是引用回复没图片")
 
-    img_path = await download_image(url)
-    encoded_image = await process_image(img_path)
-    response_text = await send_request(encoded_image)
+    try:
+        description = await VisionRouter.describe(url)
+    except VisionError as e:
+        logger.error(f"图片识别失败: {e}")
+        await vision.finish("图片识别失败, 请稍后再试")
 
-    await vision.finish(response_text['candidates'][0]['content']['parts'][0]['text'])
+    await vision.finish(description)
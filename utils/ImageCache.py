@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Awaitable, Callable, Mapping
+
+import aiofiles
+from nonebot.log import logger
+
+from core.ConfigProvider import ConfigProvider, ImageCache
+from utils.LRUCache import LRUCache
+
+
+def _scan_dir(cache_dir: str) -> list:
+    """
+    在线程中扫描缓存目录, 返回按修改时间从旧到新排序的 (digest, size) 列表
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.img'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+    entries.sort()
+    return [(digest, size) for _, digest, size in entries]
+
+
+def _remove_files(paths: list) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ImageCacheManager:
+    """
+    以内容哈希 (sha256) 为键的图片磁盘缓存
+
+    内存中维护 digest -> 字节数 的 LRU 索引, 总大小超过 ImageCache.MaxBytes 时淘汰最久未使用的图片。
+    相同内容的图片只保存一份; 最近下载过的 URL 直接命中缓存, 不再重复下载。
+    所有磁盘读写都在线程中进行, 不阻塞事件循环。
+    """
+    index: OrderedDict = OrderedDict()
+    urls: LRUCache | None = None
+    total_bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    _loaded: bool = False
+    _load_lock: asyncio.Lock | None = None
+
+    @classmethod
+    def path(cls, digest: str) -> str:
+        return os.path.join(ImageCache.Dir, f"{digest}.img")
+
+    @classmethod
+    async def load(cls) -> None:
+        """
+        启动时扫描一次缓存目录, 重建内存索引。
+        """
+        if cls._loaded:
+            return
+        if cls._load_lock is None:
+            cls._load_lock = asyncio.Lock()
+
+        async with cls._load_lock:
+            if cls._loaded:
+                return
+            entries = await asyncio.to_thread(_scan_dir, ImageCache.Dir)
+            for digest, size in entries:
+                cls.index[digest] = size
+                cls.total_bytes += size
+            cls.urls = LRUCache(max_size=ImageCache.MaxUrls, ttl=0)
+            cls._loaded = True
+            logger.info(f"图片缓存索引已加载: {len(cls.index)} 张, {cls.total_bytes} bytes")
+            await cls._evict()
+
+    @classmethod
+    async def put(cls, data: bytes) -> str:
+        """
+        写入图片, 相同内容已存在时只更新其 LRU 位置。
+
+        :param data: 图片内容
+        :return: 图片内容的 sha256
+        """
+        await cls.load()
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in cls.index:
+            cls.index.move_to_end(digest)
+            return digest
+
+        path = cls.path(digest)
+        tmp_path = f"{path}.{id(data)}.tmp"
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(data)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+
+        if digest not in cls.index:
+            cls.index[digest] = len(data)
+            cls.total_bytes += len(data)
+        await cls._evict()
+        return digest
+
+    @classmethod
+    async def read(cls, digest: str) -> bytes | None:
+        """
+        读取缓存的图片。
+
+        :param digest: 图片内容的 sha256
+        :return: 图片内容, 不在缓存中时返回 None
+        """
+        if digest not in cls.index:
+            return None
+
+        try:
+            async with aiofiles.open(cls.path(digest), 'rb') as f:
+                data = await f.read()
+        except FileNotFoundError:
+            cls.total_bytes -= cls.index.pop(digest, 0)
+            return None
+
+        if digest in cls.index:
+            cls.index.move_to_end(digest)
+        return data
+
+    @classmethod
+    async def get_or_fetch(cls, url: str, fetcher: Callable[[str], Awaitable[bytes]]) -> tuple[str, bytes]:
+        """
+        优先从缓存读取 URL 对应的图片, 未命中时调用 fetcher 下载并写入缓存。
+
+        :param url: 图片的URL地址
+        :param fetcher: 下载函数, 接收 URL 返回图片内容
+        :return: (图片内容的 sha256, 图片内容)
+        """
+        await cls.load()
+        digest = cls.urls.get(url)
+        if digest is not None and (data := await cls.read(digest)) is not None:
+            cls.hits += 1
+            return digest, data
+
+        cls.misses += 1
+        data = await fetcher(url)
+        digest = await cls.put(data)
+        cls.urls.set(url, digest)
+        return digest, data
+
+    @classmethod
+    async def _evict(cls) -> None:
+        removed = []
+        while cls.total_bytes > ImageCache.MaxBytes and cls.index:
+            digest, size = cls.index.popitem(last=False)
+            cls.total_bytes -= size
+            removed.append(cls.path(digest))
+
+        if removed:
+            cls.evictions += len(removed)
+            await asyncio.to_thread(_remove_files, removed)
+            logger.debug(f"图片缓存淘汰 {len(removed)} 张, 当前 {cls.total_bytes} bytes")
+
+    @classmethod
+    def stats(cls) -> dict:
+        total = cls.hits + cls.misses
+        return {
+            "images": len(cls.index),
+            "bytes": cls.total_bytes,
+            "hits": cls.hits,
+            "misses": cls.misses,
+            "evictions": cls.evictions,
+            "hit_rate": cls.hits / total if total else 0.0,
+        }
+
+
+async def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    """
+    MaxUrls、MaxBytes 变化后立即生效; 缓存目录只在启动时扫描, Dir 修改后需要重启。
+    """
+    if old.get('Dir') != new.get('Dir'):
+        logger.warning(f"ImageCache.Dir 修改为 {ImageCache.Dir}, 重启后生效")
+    if not ImageCacheManager._loaded:
+        return
+    if old.get('MaxUrls') != new.get('MaxUrls'):
+        ImageCacheManager.urls.resize(ImageCache.MaxUrls)
+    if old.get('MaxBytes') != new.get('MaxBytes'):
+        await ImageCacheManager._evict()
+
+
+ConfigProvider.subscribe('ImageCache', _on_config_changed)
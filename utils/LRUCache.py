@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    带过期时间的 LRU 缓存
+
+    超过容量时淘汰最久未使用的条目, 条目在写入 ttl 秒后过期。
+
+    Parameters
+    ----------
+    max_size : int
+        最大条目数, <= 0 时缓存不保存任何内容。
+    ttl : float
+        条目存活秒数, <= 0 表示永不过期。
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        读取缓存, 命中时将条目移到最近使用的位置。
+
+        Parameters
+        ----------
+        key : Hashable
+            缓存键。
+        default : Any
+            未命中或已过期时的返回值。
+
+        returns
+        -------
+        Any
+            缓存的值或 default。
+        """
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self.data[key]
+            self.misses += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        写入缓存, 超过容量时淘汰最久未使用的条目。
+
+        Parameters
+        ----------
+        key : Hashable
+            缓存键。
+        value : Any
+            缓存的值。
+        """
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl > 0 else 0
+        self.data[key] = (expires_at, value)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self.data.clear()
+
+    def resize(self, max_size: int) -> None:
+        """
+        调整容量, 超出新容量的最久未使用条目会被淘汰。
+        """
+        self.max_size = max_size
+        while self.data and len(self.data) > max(0, max_size):
+            self.data.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        returns
+        -------
+        dict
+            当前条目数、命中数、未命中数与命中率。
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self.data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self.data.get(key)
+        return entry is not None and not (entry[0] and entry[0] < time.monotonic())
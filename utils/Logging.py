@@ -0,0 +1,117 @@
+import random
+import re
+import sys
+from typing import Mapping
+
+from nonebot.log import default_filter, default_format, logger, logger_id
+
+from core.ConfigProvider import Cloudflare, ConfigProvider, Google, Log, OpenAI
+
+# 日志中需要脱敏的内容: URL 中的 key 参数、Bearer 令牌、OpenAI 风格的密钥
+secret_re = re.compile(r'((?:[?&](?:key|api_key|token)=)|(?:Bearer\s+))[^\s&"\']+|sk-[A-Za-z0-9_-]{16,}')
+# 很长的 base64 / 数字数组片段 (图片内容), 整段折叠
+blob_re = re.compile(r'[A-Za-z0-9+/=]{256,}|(?:\d{1,3},\s*){128,}\d{1,3}')
+
+
+def redact(text: str) -> str:
+    """
+    隐去 API 密钥并折叠图片内容等大段数据。只有可能命中时才执行正则, 普通短日志只有几次子串查找。
+    """
+    if len(text) >= 256:
+        text = blob_re.sub(lambda match: f"<{len(match.group())} chars>", text)
+    if '=' in text or 'Bearer' in text or 'sk-' in text:
+        text = secret_re.sub(lambda match: f"{match.group(1) or ''}***", text)
+    for secret in (OpenAI.APIKey, Google.APIKey, Cloudflare.APIKey):
+        if secret and len(secret) >= 8 and secret in text:
+            text = text.replace(secret, "***")
+    return text
+
+
+def truncate(text: str, limit: int | None = None) -> str:
+    """
+    超过 limit (默认 Log.MaxLength) 个字符时只保留开头, 并注明原长度。
+    """
+    limit = Log.MaxLength if limit is None else limit
+    if 0 < limit < len(text):
+        return f"{text[:limit]}... ({len(text)} chars)"
+    return text
+
+
+def _patch(record: dict) -> None:
+    """
+    每条日志只执行一次 (在所有 sink 之前): 截断、脱敏消息内容。
+    低于所有 sink 最低级别 (Log.Level 与 Log.ConsoleLevel 中较低者) 的日志在此之前就被丢弃。
+    通过 logger.bind(category=...) 标记、没有事先调用 Logging.sampled() 的日志在这里采样, 此时消息已经格式化,
+    未被采样的日志只跳过脱敏与截断。
+    """
+    category = record["extra"].get("category")
+    if category is not None and not Logging.sampled(category):
+        record["extra"]["sampled"] = False
+        return
+
+    record["message"] = truncate(redact(record["message"]))
+
+
+def _sampled(record: dict) -> bool:
+    return record["extra"].get("sampled", True)
+
+
+def _console_filter(record: dict) -> bool:
+    return _sampled(record) and default_filter(record)
+
+
+class Logging:
+    """
+    日志配置
+
+    控制台与文件 sink 都通过 enqueue=True 在后台线程写入, 记录日志的协程不会被磁盘 I/O 阻塞。
+    文件按 Log.Rotation 大小轮转并压缩, 最多保留 Log.Retention 个。
+    高频日志在调用前用 Logging.sampled(类别) 按 Log.Sampling 中该类别的比例采样, 未被采样时不产生任何开销。
+    所有日志在格式化前截断到 Log.MaxLength 个字符, 并隐去 API 密钥与图片数据。
+    """
+    console_id: int | None = None
+    file_id: int | None = None
+
+    @staticmethod
+    def sampled(category: str) -> bool:
+        """
+        按 Log.Sampling 中该类别的比例决定本条日志是否记录。
+        在调用 logger 之前判断, 未被采样的日志不会产生格式化、脱敏与截断的开销。
+        """
+        rate = Log.Sampling.get(category, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+    @classmethod
+    def setup(cls) -> None:
+        logger.configure(patcher=_patch)
+
+        # 替换 nonebot 默认的控制台输出, 加上采样并改为后台线程写入
+        try:
+            logger.remove(logger_id if cls.console_id is None else cls.console_id)
+        except ValueError:
+            pass
+        cls.console_id = logger.add(sys.stdout, level=Log.ConsoleLevel, diagnose=False, enqueue=True,
+                                    filter=_console_filter, format=default_format)
+
+        if cls.file_id is not None:
+            logger.remove(cls.file_id)
+            cls.file_id = None
+        if Log.File:
+            cls.file_id = logger.add(Log.File, level=Log.Level, rotation=Log.Rotation, retention=Log.Retention,
+                                     compression=Log.Compression or None, enqueue=True, diagnose=False,
+                                     encoding='utf-8', filter=_sampled, format=default_format)
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        等待队列中的日志全部写出。
+        """
+        logger.complete()
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    if Logging.console_id is not None:
+        Logging.setup()
+
+
+ConfigProvider.subscribe('Log', _on_config_changed)
@@ -1,75 +1,147 @@
+from collections import OrderedDict
+from typing import Hashable
+
+# 每条消息除内容外的固定开销 (OrderedDict 节点、消息 ID、对象头), 粗略估计
+ENTRY_OVERHEAD = 160
+
+
+def estimate_size(message) -> int:
+    """
+    粗略估计一条消息占用的内存 (字节): 固定开销 + 文本长度。
+    sys.getsizeof 在热路径上开销过大, 这里只按长度估算, 字典只统计一层。
+    """
+    if type(message) is str:
+        return ENTRY_OVERHEAD + 2 * len(message)
+    if type(message) is dict:
+        return 2 * ENTRY_OVERHEAD + sum(2 * len(value) if type(value) is str else 32 for value in message.values())
+    return ENTRY_OVERHEAD
+
+
 class MessageQueue:
-    def __init__(self, size: int):
-        self.size = size
-        self.buffer = {}
-        self.order = []
-        self.head = 0
-        self.tail = 0
-        self.count = 0
+    """
+    固定长度的消息环形缓冲区, 按插入顺序保存, 写满后覆盖最旧的消息
 
-    def add_message(self, message_id: str, _message: str) -> str:
-        if message_id in self.buffer:
+    基于 OrderedDict, 插入、更新、淘汰、按 ID 读取均为 O(1), 按顺序遍历为 O(n)。
+    更新已有消息不改变其位置。
+    """
+    __slots__ = ('size', 'buffer', 'nbytes', 'manager', 'queue_id', '__weakref__')
+
+    def __init__(self, size: int, manager: 'MessageQueueManager | None' = None, queue_id: Hashable = None):
+        self.size = size
+        self.buffer: OrderedDict = OrderedDict()
+        self.nbytes = 0
+        self.manager = manager
+        self.queue_id = queue_id
+
+    def _account(self, delta: int) -> None:
+        self.nbytes += delta
+        if self.manager is not None:
+            self.manager.account(self, delta)
+
+    def add_message(self, message_id: str, _message) -> str:
+        buffer = self.buffer
+        if message_id in buffer:
             # if Message ID exists, update the message
-            self.buffer[message_id] = _message
-        else:
-            # if Message ID does not exist, add the message
-            if self.count < self.size:
-                self.count += 1
-            else:
-                # if the buffer is full, remove the oldest message
-                oldest_id = self.order[self.head]
-                del self.buffer[oldest_id]
-                self.head = (self.head + 1) % self.size
-
-            self.buffer[message_id] = _message
-            if self.count <= self.size:
-                self.order.append(message_id)
-            else:
-                self.order[self.tail] = message_id
-            self.tail = (self.tail + 1) % self.size
+            self.update_message(message_id, _message)
+            return message_id
 
+        delta = estimate_size(_message)
+        if len(buffer) >= self.size:
+            # if the buffer is full, remove the oldest message
+            delta -= estimate_size(buffer.popitem(last=False)[1])
+
+        buffer[message_id] = _message
+        self._account(delta)
         return message_id
 
     def get_message(self, message_id: str):
         return self.buffer.get(message_id)
 
-    def update_message(self, message_id: str, new_message: str):
+    def update_message(self, message_id: str, new_message) -> bool:
         if message_id in self.buffer:
+            delta = estimate_size(new_message) - estimate_size(self.buffer[message_id])
             self.buffer[message_id] = new_message
+            self._account(delta)
             return True
         return False
 
-    def get_all_messages(self):
-        messages = []
-        index = self.head
-        for _ in range(self.count):
-            message_id = self.order[index]
-            if message_id in self.buffer:
-                messages.append((message_id, self.buffer[message_id]))
-            index = (index + 1) % self.size
-        return messages
+    def get_all_messages(self) -> list:
+        return list(self.buffer.items())
+
+    def clear(self) -> None:
+        self.buffer.clear()
+        self._account(-self.nbytes)
+
+    def __len__(self) -> int:
+        return len(self.buffer)
 
 
 class MessageQueueManager:
-    def __init__(self):
-        self.queues = {}
-        self.next_id = 0
+    """
+    管理多个消息队列, 总内存超出 max_bytes 时按最近写入顺序淘汰闲置的队列
 
-    def create_queue(self, size):
-        queue_id = self.next_id
-        self.queues[queue_id] = MessageQueue(size)
-        self.next_id += 1
+    Parameters
+    ----------
+    max_bytes : int
+        所有队列估算内存的总上限, <= 0 表示不限制。
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        self.queues: OrderedDict = OrderedDict()
+        self.next_id = 0
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def create_queue(self, size, queue_id: Hashable = None):
+        if queue_id is None:
+            queue_id = self.next_id
+            self.next_id += 1
+        self.delete_queue(queue_id)
+        self.queues[queue_id] = MessageQueue(size, manager=self, queue_id=queue_id)
         return queue_id
 
     def get_queue(self, queue_id):
         return self.queues.get(queue_id)
 
+    def get_or_create_queue(self, queue_id: Hashable, size: int) -> MessageQueue:
+        queue = self.queues.get(queue_id)
+        if queue is None:
+            queue = self.queues[queue_id] = MessageQueue(size, manager=self, queue_id=queue_id)
+        return queue
+
     def delete_queue(self, queue_id):
         if queue_id in self.queues:
-            del self.queues[queue_id]
+            queue = self.queues.pop(queue_id)
+            self.total_bytes -= queue.nbytes
+            queue.manager = None
             return True
         return False
 
+    def account(self, queue: MessageQueue, delta: int) -> None:
+        """
+        由队列在内容变化时调用: 记录内存变化, 标记该队列为最近使用, 超出上限时淘汰最久未使用的其他队列。
+        """
+        self.total_bytes += delta
+        self.queues.move_to_end(queue.queue_id)
+
+        if 0 < self.max_bytes < self.total_bytes:
+            self.evict(keep=queue.queue_id)
+
+    def evict(self, keep: Hashable = None) -> None:
+        """
+        从最久没有新消息的队列开始淘汰, 直到总内存回到上限以内。
+        """
+        while self.total_bytes > self.max_bytes and len(self.queues) > 1:
+            oldest_id = next(iter(self.queues))
+            if oldest_id == keep:
+                break
+            self.delete_queue(oldest_id)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.queues)
+
 
 if __name__ == '__main__':
     # 示例使用
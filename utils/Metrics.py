@@ -0,0 +1,176 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+# 默认的延迟分桶 (秒)
+DEFAULT_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    指标基类
+
+    Parameters
+    ----------
+    name : str
+        指标名称, 遵循 Prometheus 命名规则。
+    help_text : str
+        指标说明。
+    labels : tuple
+        标签名称, 记录时按相同顺序传入标签值。
+    """
+    kind: str = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values: dict = {}
+        self.functions: dict = {}
+
+    def set_function(self, func: Callable[[], float], labels: tuple = ()) -> None:
+        """
+        导出时调用 func 获取当前值, 适合已经在别处统计的状态 (队列长度、已有的命中计数), 平时没有任何开销。
+        """
+        self.functions[labels] = func
+
+    def samples(self) -> list:
+        for labels, func in self.functions.items():
+            try:
+                self.values[labels] = func()
+            except Exception:
+                continue
+        return [(self.name, _format_labels(self.label_names, key), value) for key, value in self.values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """
+    只增不减的计数器
+    """
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    可增可减的瞬时值, 也可以设置为在导出时调用的函数
+    """
+    kind = 'gauge'
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self.values[labels] = value
+
+    def inc(self, amount: float = 1, labels: tuple = ()) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, labels: tuple = ()) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """
+    分桶直方图, 记录一次观测为一次二分查找和两次加法
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        state = self.values.get(labels)
+        if state is None:
+            # [各分桶计数 (不累计, 最后一个为 +Inf), 总和]
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    @contextmanager
+    def time(self, labels: tuple = ()):
+        """
+        记录 with 块的耗时 (秒), 出现异常时同样记录。
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, labels)
+
+    def samples(self) -> list:
+        samples = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append((f"{self.name}_bucket", _format_labels(self.label_names, key, le), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.label_names, key), cumulative))
+        return samples
+
+
+class Metrics:
+    """
+    进程内的指标注册表, 以 Prometheus 文本格式导出
+
+    同名指标只注册一次, 重复注册返回已有的指标, 因此各模块可以在导入时直接声明自己的指标。
+    """
+    registry: dict = {}
+
+    @classmethod
+    def _register(cls, metric_type: type, name: str, *args, **kwargs):
+        metric = cls.registry.get(name)
+        if metric is None:
+            metric = cls.registry[name] = metric_type(name, *args, **kwargs)
+        elif not isinstance(metric, metric_type):
+            raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+        return metric
+
+    @classmethod
+    def counter(cls, name: str, help_text: str, labels: tuple = ()) -> Counter:
+        return cls._register(Counter, name, help_text, labels)
+
+    @classmethod
+    def gauge(cls, name: str, help_text: str, labels: tuple = ()) -> Gauge:
+        return cls._register(Gauge, name, help_text, labels)
+
+    @classmethod
+    def histogram(cls, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return cls._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    @classmethod
+    def render(cls) -> str:
+        """
+        导出全部指标。
+
+        returns
+        -------
+        str
+            Prometheus text exposition format (0.0.4)。
+        """
+        return '\n'.join(metric.render() for metric in cls.registry.values()) + '\n'
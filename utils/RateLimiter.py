@@ -0,0 +1,125 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class TokenBucket:
+    """
+    令牌桶, 以固定速率补充令牌, 桶满后不再增加
+
+    Parameters
+    ----------
+    rate : float
+        每秒补充的令牌数, <= 0 表示不限速。
+    capacity : float
+        桶容量, 即允许的最大突发量。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1.0, now: float | None = None) -> bool:
+        """
+        尝试立即取出令牌, 不等待。
+
+        Parameters
+        ----------
+        amount : float
+            需要的令牌数。
+        now : float | None
+            当前时间 (time.monotonic), 为空时自动获取。
+
+        returns
+        -------
+        bool
+            令牌充足并已扣除时返回 True, 否则返回 False。
+        """
+        if self.rate <= 0:
+            return True
+
+        self._refill(time.monotonic() if now is None else now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def refund(self, amount: float = 1.0) -> None:
+        """
+        归还已取出但未使用的令牌。
+        """
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """
+        取出令牌, 不足时按先来后到排队等待补充。
+
+        Parameters
+        ----------
+        amount : float
+            需要的令牌数, 超过桶容量时按桶容量计算。
+        """
+        if self.rate <= 0:
+            return
+
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self._refill(time.monotonic())
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    并发数 + 每分钟请求数 + 每分钟 token 数 的组合限流器
+
+    超出限制的请求会排队等待, 而不是直接发出后被上游以 429 拒绝。
+    突发容量为 10 秒的配额, 避免整分钟的配额在一瞬间被打满。
+
+    Parameters
+    ----------
+    concurrency : int
+        同时进行的请求数上限, <= 0 表示不限制。
+    requests_per_minute : int
+        每分钟请求数上限, <= 0 表示不限制。
+    tokens_per_minute : int
+        每分钟 token 数上限, <= 0 表示不限制。
+    """
+    BURST_SECONDS: int = 10
+
+    def __init__(self, concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute / 60 * self.BURST_SECONDS)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * self.BURST_SECONDS)
+
+    @asynccontextmanager
+    async def limit(self, tokens: int = 0):
+        """
+        在限流许可内执行请求。
+
+        Parameters
+        ----------
+        tokens : int
+            本次请求预计消耗的 token 数。
+        """
+        await self.requests.acquire(1)
+        if tokens > 0:
+            await self.tokens.acquire(tokens)
+
+        if self.semaphore is None:
+            yield
+            return
+
+        async with self.semaphore:
+            yield
@@ -1,9 +1,15 @@
+import asyncio
 import gc
+import re
+from typing import Mapping
 
-import spacy
 from nonebot.log import logger
 from concurrent.futures import ProcessPoolExecutor, Future
-from core.ConfigProvider import Spacy
+from core.ConfigProvider import ConfigProvider, Spacy
+from utils.Metrics import Metrics
+
+split_seconds = Metrics.histogram('splitter_seconds', "分句耗时 (秒), spacy 包含排队与进程间通信", ('tier',))
+batch_size = Metrics.histogram('splitter_batch_size', "每批提交给 spaCy 进程的文本数", buckets=(1, 2, 4, 8, 16, 32, 64))
 
 
 class SentencesSpliter:
@@ -21,10 +27,14 @@ class SentencesSpliter:
         加载指定名称的spaCy模型。
     split_text(texts: str) -> list
         将输入文本分割为句子。
+    split_texts(texts: list) -> list
+        批量分句, 一次 nlp.pipe 处理多段文本。
     release_model() -> None
         释放spaCy模型以释放资源。
     """
     nlp = None
+    # 分句只需要句子边界, 加载模型时排除这些组件以减少内存与耗时
+    EXCLUDE: tuple = ('tagger', 'morphologizer', 'ner', 'attribute_ruler', 'lemmatizer', 'textcat')
 
     @classmethod
     def load_model(cls, model_name: str) -> bool:
@@ -43,12 +53,34 @@ class SentencesSpliter:
         """
         if cls.nlp is None:
             try:
-                cls.nlp = spacy.load(model_name)
+                # spaCy 导入很慢且占用大量内存, 只在工作进程里真正加载模型时才导入
+                import spacy
+                cls.nlp = cls.trim_pipeline(spacy.load(model_name, exclude=list(cls.EXCLUDE)))
+                logger.info(f"SpaCy模型 {model_name} 已加载, 启用组件: {cls.nlp.pipe_names}")
             except Exception as e:
                 logger.error(f"Failed to load model: {model_name}, {e}")
                 return False
         return True
 
+    @staticmethod
+    def trim_pipeline(nlp):
+        """
+        模型自带 senter 时改用 senter 判断句子边界, 关闭更重的 parser;
+        tok2vec 没有其他组件使用时一并关闭。
+        """
+        if 'senter' not in nlp.component_names:
+            return nlp
+
+        nlp.enable_pipe('senter')
+        disable = ['parser']
+        tok2vec = nlp.get_pipe('tok2vec') if 'tok2vec' in nlp.pipe_names else None
+        if tok2vec is not None and 'senter' not in getattr(tok2vec, 'listening_components', []):
+            disable.append('tok2vec')
+        for name in disable:
+            if name in nlp.pipe_names:
+                nlp.disable_pipe(name)
+        return nlp
+
     @classmethod
     def split_text(cls, texts: str) -> list:
         """
@@ -72,6 +104,27 @@ class SentencesSpliter:
         _sentences = [sent.text for sent in doc.sents]
         return _sentences
 
+    @classmethod
+    def split_texts(cls, texts: list) -> list:
+        """
+        使用 nlp.pipe 批量分句, 一次进程间调用处理多段文本。
+
+        Parameters
+        ----------
+        texts : list
+            要分割为句子的多段输入文本。
+
+        returns
+        -------
+        list
+            与输入一一对应的句子列表。如果未加载模型，则每段都返回空列表。
+        """
+        if cls.nlp is None:
+            logger.error("SpaCy模型未加载")
+            return [[] for _ in texts]
+
+        return [[sent.text for sent in doc.sents] for doc in cls.nlp.pipe(texts, batch_size=max(1, len(texts)))]
+
     @classmethod
     def release_model(cls) -> None:
         """
@@ -87,13 +140,110 @@ class SentencesSpliter:
             logger.info("SpaCy模型已释放")
 
 
+# 闭合引号/括号, 跟在结束符后面时属于前一句
+CLOSERS = '”’」』）)】》\\]'
+# 句末常见的 emoji 与语气符号, 跟在结束符后面时属于前一句
+TAILS = '~～\u2600-\u27bf\ufe0f\u200d\U0001f000-\U0001faff'
+
+split_re = re.compile(
+    # URL 整体跳过, 其中的 "." "?" 不作为句子结束
+    r'(?P<url>(?:https?|ftp)://[\x21-\x7e]+|www\.[\x21-\x7e]+)'
+    # 中英文结束符、省略号、换行; 英文句点只在其后 (可隔一个英文双引号) 是空白、结尾或非 ASCII 字符时才算结束
+    # (排除小数、版本号)
+    r'|(?P<end>(?:[。！？!?…\n]|\.(?:\.+|(?="?(?:\s|$|[^\x00-\x7f]))))+'
+    rf'[{CLOSERS}]*[{TAILS}]*)'
+)
+
+
+class RuleSentencesSpliter:
+    """
+    基于规则的中文分句, 纯 Python 实现, 不需要模型与进程间通信
+
+    处理中英文结束符、连续结束符 (如 "？！"、"……")、句末的闭合引号与 emoji, 以及 URL 与小数中的句点。
+    适用于聊天中常见的短文本, 长文本仍交给 spaCy。
+    """
+
+    @classmethod
+    def split_text(cls, texts: str) -> list:
+        """
+        将输入文本分割为句子。
+
+        Parameters
+        ----------
+        texts : str
+            要分割为句子的输入文本。
+
+        returns
+        -------
+        list
+            从输入文本中提取的句子列表, 不含空句。
+        """
+        sentences = []
+        start = 0
+        for match in split_re.finditer(texts):
+            if match.lastgroup == 'url':
+                continue
+            end = match.end()
+            # 英文双引号不区分开闭, 当前句中引号未配对时才把它归入本句
+            if end < len(texts) and texts[end] == '"' and texts.count('"', start, end) % 2 == 1:
+                end += 1
+            if sentence := texts[start:end].strip():
+                sentences.append(sentence)
+            start = end
+
+        if sentence := texts[start:].strip():
+            sentences.append(sentence)
+        return sentences
+
+
 class SentencesSpliterManager:
     """
     管理 SentencesSpliter 类的进程池管理类
+
+    不超过 Spacy.RuleMaxLength 的文本直接用 RuleSentencesSpliter 在当前进程分句, 更长的文本才交给 spaCy 进程池。
+    进程池在第一次使用时才创建; Spacy.ENABLE 为 False 时不创建进程池, 全部使用规则分句。
+    并发的分句请求会在 Spacy.BatchWindow 秒内攒成一批 (最多 Spacy.BatchSize 段), 一次进程间调用批量处理。
     """
 
-    # global ProcessPoolExecutor
-    executor = ProcessPoolExecutor(max_workers=1)
+    # global ProcessPoolExecutor, 第一次使用时按 Spacy.Workers 创建
+    executor: ProcessPoolExecutor | None = None
+    # 等待批量处理的 (文本, Future)
+    pending: list = []
+    flush_handle: asyncio.TimerHandle | None = None
+    # 已提交到进程池但尚未完成的批次数
+    in_flight: int = 0
+
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        """
+        获取进程池, 不存在时创建。每个工作进程启动时都会加载 spaCy 模型。
+
+        returns
+        -------
+        ProcessPoolExecutor
+            分句使用的进程池。
+        """
+        if cls.executor is None:
+            cls.executor = ProcessPoolExecutor(max_workers=max(1, Spacy.Workers),
+                                               initializer=SentencesSpliter.load_model,
+                                               initargs=(Spacy.MODEL,))
+        return cls.executor
+
+    @classmethod
+    def preload_model(cls) -> Future:
+        """
+        在后台开始加载 spaCy 模型, 不等待加载完成
+
+        returns
+        -------
+        Future
+            加载结果, 模型加载成功时为 True。未启用 spaCy 时为 False。
+        """
+        if not Spacy.ENABLE:
+            future = Future()
+            future.set_result(False)
+            return future
+        return cls.get_executor().submit(SentencesSpliter.load_model, Spacy.MODEL)
 
     @classmethod
     def initialize_model(cls) -> bool:
@@ -105,13 +255,18 @@ class SentencesSpliterManager:
         bool
             如果模型加载成功，返回 True；否则返回 False。
         """
-        future: Future = cls.executor.submit(SentencesSpliter.load_model, Spacy.MODEL)
-        return future.result()
+        return cls.preload_model().result()
+
+    @staticmethod
+    def use_rules(text: str, config=None) -> bool:
+        if config is None:
+            config = ConfigProvider.snapshot.Spacy
+        return not config.ENABLE or len(text) <= config.RuleMaxLength
 
     @classmethod
-    def split_text(cls, text: str) -> list:
+    async def split_text(cls, text: str) -> list:
         """
-        在独立进程中分句
+        在独立进程中分句, 等待期间不阻塞事件循环
 
         Parameters
         ----------
@@ -123,13 +278,99 @@ class SentencesSpliterManager:
         list
             从输入文本中提取的句子列表。
         """
-        future: Future = cls.executor.submit(SentencesSpliter.split_text, text)
+        config = ConfigProvider.snapshot.Spacy
+        if cls.use_rules(text, config):
+            with split_seconds.time(('rules',)):
+                return RuleSentencesSpliter.split_text(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cls.pending.append((text, future))
+        if len(cls.pending) >= config.BatchSize:
+            cls._flush()
+        elif cls.flush_handle is None:
+            cls.flush_handle = loop.call_later(config.BatchWindow, cls._flush)
+        with split_seconds.time(('spacy',)):
+            return await future
+
+    @classmethod
+    def _flush(cls) -> None:
+        """
+        把当前攒下的请求作为一批提交到进程池。
+        """
+        if cls.flush_handle is not None:
+            cls.flush_handle.cancel()
+            cls.flush_handle = None
+
+        batch, cls.pending = cls.pending, []
+        if not batch:
+            return
+
+        loop = asyncio.get_running_loop()
+        result = loop.run_in_executor(cls.get_executor(), SentencesSpliter.split_texts, [text for text, _ in batch])
+        result.add_done_callback(lambda done: cls._resolve(batch, done))
+        cls.in_flight += 1
+        batch_size.observe(len(batch))
+
+    @classmethod
+    def _resolve(cls, batch: list, done: asyncio.Future) -> None:
+        cls.in_flight -= 1
+        if done.cancelled():
+            error = asyncio.CancelledError()
+        else:
+            error = done.exception()
+
+        for idx, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[idx])
+
+    @classmethod
+    def split_text_sync(cls, text: str) -> list:
+        """
+        在独立进程中分句, 阻塞直到完成。仅用于没有事件循环的场景。
+
+        Parameters
+        ----------
+        text : str
+            要分割为句子的输入文本。
+
+        returns
+        -------
+        list
+            从输入文本中提取的句子列表。
+        """
+        if cls.use_rules(text):
+            return RuleSentencesSpliter.split_text(text)
+        future: Future = cls.get_executor().submit(SentencesSpliter.split_text, text)
         return future.result()
 
+    @classmethod
+    def on_config_changed(cls, old: Mapping, new: Mapping) -> None:
+        """
+        Workers、MODEL 或 ENABLE 变化时关闭旧进程池, 已提交的批次继续执行完;
+        仍启用 spaCy 时按新配置创建进程池并在后台加载模型。
+        """
+        if all(old.get(key) == new.get(key) for key in ('ENABLE', 'MODEL', 'Workers')):
+            return
+        if cls.executor is not None:
+            cls.executor.shutdown(wait=False)
+            cls.executor = None
+            logger.info("spaCy 配置已变化, 旧进程池已关闭")
+            cls.preload_model()
+
     @classmethod
     def release_model(cls) -> None:
         """
         释放 spaCy 模型
         """
+        if cls.executor is None:
+            return
         future: Future = cls.executor.submit(SentencesSpliter.release_model)
         future.result()  # 确保释放完成
+
+
+ConfigProvider.subscribe('Spacy', SentencesSpliterManager.on_config_changed)
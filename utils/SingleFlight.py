@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+from utils.LRUCache import LRUCache
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用: 同一时刻同一个键只会真正执行一次, 其余调用方等待并共享结果
+
+    Parameters
+    ----------
+    ttl : float
+        完成后结果继续保留的秒数, 用于服务刚好在完成之后到达的请求。<= 0 表示不保留。
+    max_size : int
+        保留结果的最大条数。
+    """
+
+    def __init__(self, ttl: float = 0, max_size: int = 128):
+        self.calls: dict = {}
+        self.results = LRUCache(max_size=max_size if ttl > 0 else 0, ttl=ttl)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一次调用。
+
+        Parameters
+        ----------
+        key : Hashable
+            合并调用使用的键。
+        func : Callable[[], Awaitable[Any]]
+            真正执行调用的协程函数, 只有第一个调用方的 func 会被执行。
+
+        returns
+        -------
+        Any
+            调用结果。调用抛出的异常会传递给所有等待方, 且不会被保留。
+        """
+        if (cached := self.results.get(key, _MISSING)) is not _MISSING:
+            return cached
+
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, func))
+            self.calls[key] = task
+
+        # 某个调用方被取消时不影响其他等待方
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await func()
+            self.results.set(key, result)
+            return result
+        finally:
+            self.calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self.calls)
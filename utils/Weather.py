@@ -1,5 +1,6 @@
 import asyncio
 import hashlib
+import os
 import random
 import time
 
@@ -8,6 +9,8 @@ from loguru import logger
 
 
 class Weather:
+    # 上次成功获取的种子, 网络不可用时作为后备
+    seed_file = 'cache/seed'
     index_url = 'https://h5.caiyunapp.com/h5'
     res_url = 'https://h5.caiyunapp.com/api/'
     headers = {
@@ -77,3 +80,44 @@ class Weather:
                         logger.error(f"Failed to get weather, status code: {response.status}")
             except Exception as e:
                 logger.error(f"Exception occurred while getting weather: {e}")
+
+    @classmethod
+    async def fetch_seed(cls, timeout: float) -> tuple[int, str]:
+        """
+        在 timeout 秒内获取 ticket 和天气种子, 超时或失败时依次使用缓存的种子、本地随机种子。
+
+        :param timeout: 获取 ticket 与种子的总时限 (秒)
+        :return: (种子, 来源), 来源为 'weather'、'cache' 或 'local'
+        """
+        async def fetch() -> int | None:
+            await cls.get_ticket()
+            return await cls.get_seed()
+
+        try:
+            seed = await asyncio.wait_for(fetch(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"获取随机数种子超时 ({timeout}s)")
+            seed = None
+
+        if seed is not None:
+            try:
+                await asyncio.to_thread(cls._save_seed, seed)
+            except OSError as e:
+                logger.warning(f"保存随机数种子失败: {e}")
+            return seed, 'weather'
+
+        try:
+            return await asyncio.to_thread(cls._load_seed), 'cache'
+        except (OSError, ValueError):
+            return int.from_bytes(os.urandom(4), 'big'), 'local'
+
+    @classmethod
+    def _save_seed(cls, seed: int) -> None:
+        os.makedirs(os.path.dirname(cls.seed_file), exist_ok=True)
+        with open(cls.seed_file, 'w') as f:
+            f.write(str(seed))
+
+    @classmethod
+    def _load_seed(cls) -> int:
+        with open(cls.seed_file) as f:
+            return int(f.read().strip())
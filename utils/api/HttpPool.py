@@ -0,0 +1,123 @@
+import asyncio
+from typing import Mapping
+
+import aiohttp
+from nonebot.log import logger
+
+from core.ConfigProvider import ConfigProvider, Http
+
+
+class HttpPool:
+    """
+    按上游划分的长连接池, 每个上游持有一个复用 keep-alive 连接的 aiohttp.ClientSession
+
+    Parameters
+    ----------
+    UPSTREAMS : tuple
+        已知的上游名称, 驱动启动时会为它们预先创建连接池。
+    _sessions : dict
+        上游名称到 ClientSession 的映射。
+    _retired : dict
+        已被替换、等待关闭的 ClientSession 到其延迟关闭任务的映射。
+
+    returns
+    -------
+    get_session(upstream: str) -> aiohttp.ClientSession
+        获取指定上游的连接池, 不存在或已关闭时自动创建。
+    startup() -> None
+        驱动启动时创建所有连接池。
+    shutdown() -> None
+        驱动关闭时关闭所有连接池, 包括已被替换但尚未关闭的连接池。
+    reset(upstream: str | None) -> None
+        配置变化后替换连接池, 旧连接池在进行中的请求结束后关闭。
+    """
+    UPSTREAMS: tuple = ('openai', 'gemini', 'cloudflare', 'image')
+    # 替换连接池后, 旧连接池再保留多久才关闭 (秒), 让进行中的请求正常结束
+    CLOSE_GRACE: float = 60
+    _sessions: dict = {}
+    _retired: dict = {}
+
+    @classmethod
+    def _create_session(cls, upstream: str) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=Http.Limit,
+                                         limit_per_host=Http.LimitPerHost,
+                                         keepalive_timeout=Http.KeepAliveTimeout)
+        timeout = aiohttp.ClientTimeout(total=None, connect=Http.ConnectTimeout)
+        logger.debug(f"创建连接池: {upstream}, limit={Http.Limit}, limit_per_host={Http.LimitPerHost}")
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    @classmethod
+    def get_session(cls, upstream: str) -> aiohttp.ClientSession:
+        """
+        获取指定上游的连接池。
+
+        Parameters
+        ----------
+        upstream : str
+            上游名称, 例如 'openai'、'gemini'。
+
+        returns
+        -------
+        aiohttp.ClientSession
+            该上游共享的 ClientSession, 调用方不应关闭它。
+        """
+        session = cls._sessions.get(upstream)
+        if session is None or session.closed:
+            session = cls._create_session(upstream)
+            cls._sessions[upstream] = session
+        return session
+
+    @classmethod
+    async def startup(cls) -> None:
+        """
+        创建所有已知上游的连接池。
+        """
+        for upstream in cls.UPSTREAMS:
+            cls.get_session(upstream)
+        logger.info(f"HTTP 连接池已就绪: {', '.join(cls.UPSTREAMS)}")
+
+    @classmethod
+    async def shutdown(cls) -> None:
+        """
+        关闭所有连接池。
+        """
+        for upstream, session in list(cls._sessions.items()):
+            if not session.closed:
+                await session.close()
+            del cls._sessions[upstream]
+        for session, task in list(cls._retired.items()):
+            task.cancel()
+            if not session.closed:
+                await session.close()
+        cls._retired.clear()
+        logger.info("HTTP 连接池已关闭")
+
+    @classmethod
+    def reset(cls, upstream: str | None = None) -> None:
+        """
+        替换指定上游 (为空时为全部上游) 的连接池, 之后的请求使用新建的连接池。
+
+        Parameters
+        ----------
+        upstream : str | None
+            上游名称。
+        """
+        upstreams = [upstream] if upstream is not None else list(cls._sessions)
+        for name in upstreams:
+            session = cls._sessions.pop(name, None)
+            if session is not None and not session.closed:
+                cls._retired[session] = asyncio.ensure_future(cls._close_later(session))
+                logger.info(f"连接池 {name} 已替换")
+
+    @classmethod
+    async def _close_later(cls, session: aiohttp.ClientSession) -> None:
+        await asyncio.sleep(cls.CLOSE_GRACE)
+        await session.close()
+        cls._retired.pop(session, None)
+
+
+def _on_http_config_changed(old: Mapping, new: Mapping) -> None:
+    HttpPool.reset()
+
+
+ConfigProvider.subscribe('Http', _on_http_config_changed)
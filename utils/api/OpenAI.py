@@ -1,125 +1,271 @@
 import json
-from typing import Any
+import re
+import time
+import unicodedata
+from typing import Any, Mapping
 
-import aiohttp
 from loguru import logger
 
-from core.ConfigProvider import OpenAI
+from core.ConfigProvider import ConfigProvider, OpenAI
+from utils.api.HttpPool import HttpPool
+from utils.LRUCache import LRUCache
+from utils.Metrics import Metrics
+from utils.RateLimiter import RateLimiter
+
+whitespace_re = re.compile(r'\s+')
+
+
+class OpenAIRequest:
+    """
+    单次 chat/completions 请求
+
+    请求体、请求头和地址都在构造时根据当前配置生成, 不与其他请求共享可变状态,
+    因此不同群的并发请求不会互相覆盖 prompt, 流式请求也不会影响之后的普通请求。
+
+    Parameters
+    ----------
+    context : str
+        用户输入内容。
+    stream : bool
+        是否使用流式响应。
+    config : OpenAI 配置快照 | None
+        使用的 OpenAI 配置, 为空时取当前快照。
+    """
+
+    def __init__(self, context: str, stream: bool = False, config=None):
+        if config is None:
+            config = ConfigProvider.snapshot.OpenAI
+        self.url = f"{'https' if config.Https else 'http'}://{config.BaseUrl}/v1/chat/completions"
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {config.APIKey}"
+        }
+        self.data = {
+            "model": config.MODEL,
+            "max_tokens": config.MaxTokens,
+            "temperature": 0.7,
+            "messages": [{"role": "user", "content": context}],
+            "stream": stream,
+        }
+        # 粗略估计: 中文约 1 字 1 token, 再加上最大输出长度
+        self.estimated_tokens = len(context) + config.MaxTokens
+
+
+def cache_key(context: str, model: str | None = None) -> tuple:
+    """
+    生成回复缓存的键: 模型名 + 规范化后的输入 (NFKC、去首尾空白、合并连续空白)
+    """
+    normalized = whitespace_re.sub(' ', unicodedata.normalize('NFKC', context)).strip()
+    return model if model is not None else ConfigProvider.snapshot.OpenAI.MODEL, normalized
+
+
+request_seconds = Metrics.histogram('openai_request_seconds', "OpenAI 请求耗时 (秒), 流式请求为完整响应的耗时", ('mode',))
+cache_total = Metrics.counter('openai_cache_total', "OpenAI 回复缓存查询次数", ('result',))
+errors_total = Metrics.counter('openai_errors_total', "OpenAI 请求失败次数", ('mode',))
 
 
 class OpenAIAPI:
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {OpenAI.APIKey}"
-    }
+    _limiter: RateLimiter | None = None
+    _cache: LRUCache | None = None
 
-    data = {
-        "model": "gpt-4o",
-        "max_tokens": 1000,
-        "temperature": 0.7,
-    }
+    @classmethod
+    def get_limiter(cls) -> RateLimiter:
+        if cls._limiter is None:
+            cls._limiter = RateLimiter(concurrency=OpenAI.MaxConcurrency,
+                                       requests_per_minute=OpenAI.RequestsPerMinute,
+                                       tokens_per_minute=OpenAI.TokensPerMinute)
+        return cls._limiter
 
     @classmethod
-    async def call_openai_api(cls, context: str) -> str:
-        cls.data["messages"] = [{"role": "user", "content": context}]
+    def get_cache(cls) -> LRUCache:
+        if cls._cache is None:
+            cls._cache = LRUCache(max_size=OpenAI.CacheSize, ttl=OpenAI.CacheTTL)
+        return cls._cache
 
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url="https://" if OpenAI.Https else "http://"
-                                                                    + OpenAI.BaseUrl + "/v1/chat/completions",
-                                        headers=cls.headers,
-                                        json=cls.data) as response:
-                    result = await response.json()
+    @classmethod
+    async def call_openai_api(cls, context: str, use_cache: bool = True) -> str:
+        # 整个请求使用同一个配置版本, 等待限流期间配置被重新加载也不会混用新旧配置
+        config = ConfigProvider.snapshot.OpenAI
+        key = cache_key(context, config.MODEL)
+        if use_cache and (cached := cls.get_cache().get(key)) is not None:
+            logger.debug(f"回复缓存命中: {key[1][:20]}")
+            cache_total.inc(labels=('hit',))
+            return cached
+        cache_total.inc(labels=('miss',))
 
-                    if response.status == 200:
-                        return result["choices"][0]["message"]["content"][1]["text"].get("content", "未响应任何值").strip()
-                        # return result["choices"][0]["message"]["content"].strip()
-                    else:
-                        return f"请求失败: {result.get('error', {}).get('message', '未知错误')}"
-            except Exception as e:
-                logger.error(f"请求出错: {e}")
-                return f"请求出错: {str(e)}"
+        request = OpenAIRequest(context, config=config)
+
+        session = HttpPool.get_session('openai')
+        try:
+            async with cls.get_limiter().limit(request.estimated_tokens):
+                with request_seconds.time(('chat',)):
+                    async with session.post(url=request.url, headers=request.headers, json=request.data) as response:
+                        result = await response.json()
+
+                if response.status == 200:
+                    content = result["choices"][0]["message"]["content"][1]["text"].get("content", "未响应任何值").strip()
+                    # content = result["choices"][0]["message"]["content"].strip()
+                    if use_cache:
+                        cls.get_cache().set(key, content)
+                    return content
+                else:
+                    errors_total.inc(labels=('chat',))
+                    return f"请求失败: {result.get('error', {}).get('message', '未知错误')}"
+        except Exception as e:
+            logger.error(f"请求出错: {e}")
+            errors_total.inc(labels=('chat',))
+            return f"请求出错: {str(e)}"
 
     @classmethod
-    async def call_openai_api_stream(cls, context: str):
-        cls.data["messages"] = [{"role": "user", "content": context}]
-        cls.data["stream"] = True
-        full_response = ""
-
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(url="https://" if OpenAI.Https else "http://"
-                                                                    + OpenAI.BaseUrl, headers=cls.headers,
-                                        data=json.dumps(cls.data)) as response:
+    async def call_openai_api_stream(cls, context: str, use_cache: bool = True):
+        config = ConfigProvider.snapshot.OpenAI
+        key = cache_key(context, config.MODEL)
+        if use_cache and (cached := cls.get_cache().get(key)) is not None:
+            logger.debug(f"回复缓存命中: {key[1][:20]}")
+            cache_total.inc(labels=('hit',))
+            yield cached
+            return
+        cache_total.inc(labels=('miss',))
+
+        request = OpenAIRequest(context, stream=True, config=config)
+        deltas = []
+
+        session = HttpPool.get_session('openai')
+        start = time.perf_counter()
+        try:
+            async with cls.get_limiter().limit(request.estimated_tokens):
+                async with session.post(url=request.url, headers=request.headers,
+                                        data=json.dumps(request.data)) as response:
                     if response.status == 200:
                         async for line in response.content:
                             line = line.decode('utf-8').strip()
 
                             if line.startswith("data: "):
-                                line_content = line.split("data: ")[1].strip()
+                                line_content = line[6:].strip()
                                 if line_content == "[DONE]":
+                                    if use_cache and deltas:
+                                        cls.get_cache().set(key, ''.join(deltas))
                                     break
                                 try:
                                     json_content = json.loads(line_content)
                                     delta = json_content.get("choices", [{}])[0].get("delta", {}).get("content", "")
                                     if delta:
-                                        full_response += delta
-                                        yield full_response
+                                        deltas.append(delta)
+                                        yield delta
                                 except json.JSONDecodeError:
                                     logger.warning(f"无法解析JSON: {line_content}")
                                     continue
                     else:
+                        errors_total.inc(labels=('stream',))
                         result = await response.json()
                         logger.error(f"请求失败: {result.get('error', {}).get('message', '未知错误')}")
-            except Exception as e:
-                logger.error(f"请求出错: {str(e)}")
+        except Exception as e:
+            errors_total.inc(labels=('stream',))
+            logger.error(f"请求出错: {str(e)}")
+        finally:
+            request_seconds.observe(time.perf_counter() - start, ('stream',))
+
+    @classmethod
+    def on_config_changed(cls, old: Mapping, new: Mapping) -> None:
+        """
+        OpenAI 配置变化时只重建受影响的部分, 缓存键已包含模型名, 换模型无需清空缓存。
+        """
+        def changed(*keys):
+            return any(old.get(key) != new.get(key) for key in keys)
+
+        if changed('MaxConcurrency', 'RequestsPerMinute', 'TokensPerMinute'):
+            cls._limiter = None
+        if changed('CacheSize', 'CacheTTL'):
+            cls._cache = None
+        if changed('Https', 'BaseUrl', 'APIKey'):
+            HttpPool.reset('openai')
+
+
+ConfigProvider.subscribe('OpenAI', OpenAIAPI.on_config_changed)
 
 
 class ResponseReader:
+    """
+    读取流式响应的增量内容, 并增量地切分出完整句子
+
+    每段增量只扫描一次, 未成句的片段暂存在列表中, 成句时才拼接一次,
+    因此总耗时与响应长度成线性关系。连续的结束符 (如 "？！"、"。。。") 视为同一句的结尾。
+    """
+    END_CHARS: frozenset = frozenset(['。', '！', '？', '.', '?', '!'])
+
     def __init__(self, generator):
         self.generator = generator
-        self.current_response = ""
-        self.last_position = 0
+        self.pending: list[str] = []
+        self.after_end = False
 
     async def read(self) -> Any | None:
         try:
-            self.current_response = await self.generator.__anext__()
+            return await self.generator.__anext__()
         except StopAsyncIteration:
             return None
 
-        new_content = self.current_response[self.last_position:]
-        self.last_position = len(self.current_response)
-        return new_content
+    def feed(self, delta: str) -> list[str]:
+        """
+        输入一段增量内容, 返回因此而完整的句子。
+
+        Parameters
+        ----------
+        delta : str
+            流式响应中新到达的内容。
 
-    def get_sentences(self, content) -> tuple[list[str], str]:
-        end_chars = ['。', '！', '？', '.', '?', '!']
+        returns
+        -------
+        list[str]
+            已完整的句子, 不含空句。
+        """
+        end_chars = self.END_CHARS
         sentences = []
         start = 0
 
-        for idx, char in enumerate(content):
+        for idx, char in enumerate(delta):
             if char in end_chars:
-                sentences.append(content[start:idx + 1].strip())
-                start = idx + 1
+                self.after_end = True
+            elif self.after_end:
+                self.after_end = False
+                self.pending.append(delta[start:idx])
+                sentence = ''.join(self.pending).strip()
+                self.pending.clear()
+                start = idx
+                if sentence:
+                    sentences.append(sentence)
 
-        return sentences, content[start:]
+        if start < len(delta):
+            self.pending.append(delta[start:])
+        return sentences
+
+    def flush(self) -> str:
+        """
+        取出剩余未成句的内容并重置状态。
+
+        returns
+        -------
+        str
+            剩余内容。
+        """
+        rest = ''.join(self.pending)
+        self.pending.clear()
+        self.after_end = False
+        return rest
 
 
 async def main():
     context = "写一篇200字的故事"
     generator = OpenAIAPI.call_openai_api_stream(context=context)
     reader = ResponseReader(generator)
-    collected_content = ""
 
-    while True:
-        part = await reader.read()
-        if not part:
-            break
+    while (part := await reader.read()) is not None:
+        for sentence in reader.feed(part):
+            logger.debug(sentence)
 
-        collected_content += part
-        sentences, collected_content = reader.get_sentences(collected_content)
+    if rest := reader.flush().strip():
+        logger.debug(rest)
 
-        for sentence in sentences:
-            logger.debug(sentence)
+    await HttpPool.shutdown()
 
 
 if __name__ == '__main__':
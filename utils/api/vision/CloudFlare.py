@@ -1,68 +1,100 @@
-import asyncio
-import os
+import base64
+import json
 import ssl
-import time
-from datetime import datetime
 
 import aiohttp
 from nonebot.log import logger
 
 from core.ConfigProvider import Cloudflare
+from utils.api.HttpPool import HttpPool
+from utils.ImageCache import ImageCacheManager
+from utils.Metrics import Metrics
 
-# 缓存图片的目录
-IMAGE_CACHE_DIR = "mybot/plugins/chatgpt/image_cache"
 
-# 创建缓存目录，如果不存在
-if not os.path.exists(IMAGE_CACHE_DIR):
-    os.makedirs(IMAGE_CACHE_DIR)
-    logger.info(f"创建缓存目录: {IMAGE_CACHE_DIR}")
+class ImageTooLargeError(Exception):
+    pass
 
 
-async def clear_image_cache():
+IMAGE_TO_TEXT_FAILED = "[image 转文字失败]"
+PROMPT = "Generate a title for this image, include emotion, if it has emotion."
+# array 编码时每个字节对应的十进制文本, 分块拼接以限制中间对象数量
+BYTE_DIGITS = tuple(str(i).encode('ascii') for i in range(256))
+ARRAY_CHUNK = 64 * 1024
+
+stage_seconds = Metrics.histogram('vision_stage_seconds', "图片识别各阶段耗时 (秒)", ('provider', 'stage'))
+
+
+def create_ssl_context() -> ssl.SSLContext:
+    ssl_context = ssl.create_default_context()
+    ssl_context.set_ciphers("DEFAULT@SECLEVEL=1")  # 降低 SSL 等级
+    return ssl_context
+
+
+async def fetch_image_buffer(url: str, max_bytes: int) -> memoryview:
     """
-    定期清理缓存图片的任务，每隔600秒自动清理过期缓存。
+    流式下载图片到内存中的有界缓冲区, 不落盘。
+
+    :param url: 图片的URL地址
+    :param max_bytes: 允许的最大字节数, 超出时抛出 ImageTooLargeError
+    :return: 图片内容的 memoryview
     """
-    while True:
-        now = time.time()
-        deleted_files = 0
-        deleted_size = 0
-        for filename in os.listdir(IMAGE_CACHE_DIR):
-            file_path = os.path.join(IMAGE_CACHE_DIR, filename)
-            if os.path.isfile(file_path) and now - os.path.getmtime(file_path) > 600:
-                deleted_size += os.path.getsize(file_path)
-                os.remove(file_path)
-                deleted_files += 1
-                logger.info(f"已删除缓存图片: {file_path}")
-        logger.info(f"清理缓存完成，删除文件数: {deleted_files}, 总大小: {deleted_size} bytes")
-        await asyncio.sleep(600)
+    session = HttpPool.get_session('image')
+    async with session.get(url, ssl=create_ssl_context()) as response:
+        if response.status != 200:
+            raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
 
+        if response.content_length is not None and response.content_length > max_bytes:
+            raise ImageTooLargeError(f"图片大小 {response.content_length} 超过上限 {max_bytes}")
 
-async def download_image(url: str) -> str:
+        buffer = bytearray()
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            if len(buffer) + len(chunk) > max_bytes:
+                raise ImageTooLargeError(f"图片大小超过上限 {max_bytes}")
+            buffer += chunk
+
+    return memoryview(buffer)
+
+
+async def fetch_image(url: str) -> bytes:
+    return bytes(await fetch_image_buffer(url, Cloudflare.MaxImageBytes))
+
+
+def build_request_body(image: memoryview | bytes, encoding: str = "array") -> bytes:
     """
-    下载图片到本地的函数构成，使用时间戳命名文件以确保唯一性。
-    
-    :param url: 图片的URL地址
-    :return: 本地图片路径
+    构造 Workers AI 请求体。
+
+    array: 默认格式, 图片以整数数组传递, 体积约为原图的 3.5 倍; 直接拼接字节, 不构造 Python 整数列表。
+    base64: 图片以 base64 字符串传递, 体积约为原图的 4/3; 尚未在线上接口验证, 需要在配置中显式开启。
+
+    :param image: 图片内容
+    :param encoding: 图片编码方式, "array" 或 "base64"
+    :return: JSON 请求体
     """
-    ssl_context = ssl.create_default_context()
-    ssl_context.set_ciphers("DEFAULT@SECLEVEL=1")  # 降低 SSL 等级
-    
-    # 使用时间戳命名文件
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-    image_filename = f"{timestamp}.jpg"
-    image_path = os.path.join(IMAGE_CACHE_DIR, image_filename)
+    rest = json.dumps({"prompt": PROMPT, "max_tokens": 512}, separators=(',', ':'))[1:].encode('utf-8')
+    if encoding == "array":
+        image_field = bytearray(b'[')
+        for offset in range(0, len(image), ARRAY_CHUNK):
+            if offset:
+                image_field += b','
+            image_field += b','.join(map(BYTE_DIGITS.__getitem__, image[offset:offset + ARRAY_CHUNK]))
+        image_field += b']'
+    else:
+        image_field = b'"' + base64.b64encode(image) + b'"'
+    return b''.join((b'{"image":', image_field, b',', rest))
+
+
+async def get_image(url: str) -> tuple[str, bytes] | None:
+    """
+    从共享的图片缓存获取图片, 未命中时下载。缓存以内容哈希命名文件, 相同图片只保存一份。
 
+    :param url: 图片的URL地址
+    :return: (图片内容的 sha256, 图片内容), 失败时返回 None
+    """
     try:
-        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=10)) as session:
-            async with session.get(url, ssl=ssl_context) as response:
-                if response.status == 200:
-                    with open(image_path, 'wb') as f:
-                        f.write(await response.read())
-                    logger.info(f"图片下载成功: {image_path}")
-                    return image_path
-                else:
-                    logger.error(f"无法下载图片: {url}, 状态码: {response.status}")
-                    return None
+        return await ImageCacheManager.get_or_fetch(url, fetch_image)
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"无法下载图片: {url}, 状态码: {e.status}")
+        return None
     except aiohttp.ClientError as e:
         logger.error(f"下载图片请求失败: {e}")
         return None
@@ -71,6 +103,21 @@ async def download_image(url: str) -> str:
         return None
 
 
+async def download_image(url: str) -> str:
+    """
+    下载图片到共享的图片缓存。
+    
+    :param url: 图片的URL地址
+    :return: 本地图片路径
+    """
+    if (image := await get_image(url)) is None:
+        return None
+
+    image_path = ImageCacheManager.path(image[0])
+    logger.info(f"图片下载成功: {image_path}")
+    return image_path
+
+
 async def image_to_text(image_url: str) -> str:
     """
     调用 Workers AI 进行图像转文字描述。
@@ -80,44 +127,48 @@ async def image_to_text(image_url: str) -> str:
     """
     logger.info(f"Starting image to text conversion for URL: {image_url}")
 
-    # 下载图片到本地
-    image_path = await download_image(image_url)
-    if not image_path:
-        return "[image 转文字失败]"
+    # 下载图片到内存, 不经过磁盘
+    try:
+        with stage_seconds.time(('cloudflare', 'download')):
+            image = await fetch_image_buffer(image_url, Cloudflare.MaxImageBytes)
+    except ImageTooLargeError as e:
+        logger.error(f"{e}: {image_url}")
+        return IMAGE_TO_TEXT_FAILED
+    except aiohttp.ClientResponseError as e:
+        logger.error(f"无法下载图片: {image_url}, 状态码: {e.status}")
+        return IMAGE_TO_TEXT_FAILED
+    except aiohttp.ClientError as e:
+        logger.error(f"下载图片请求失败: {e}")
+        return IMAGE_TO_TEXT_FAILED
 
-    url = f"https://api.cloudflare.com/client/v4/accounts/{Cloudflare.AccountID}/ai/run/@cf/llava-hf/llava-1.5-7b-hf"
+    url = f"{Cloudflare.BaseUrl}/client/v4/accounts/{Cloudflare.AccountID}/ai/run/@cf/llava-hf/llava-1.5-7b-hf"
     headers = {
-        "Authorization": f"Bearer {Cloudflare.API_Key}",
+        "Authorization": f"Bearer {Cloudflare.APIKey}",
         "Content-Type": "application/json"
     }
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            with open(image_path, 'rb') as f:
-                image_blob = f.read()
-
-            image_array = list(image_blob)
-            inputs = {
-                "image": image_array,
-                "prompt": "Generate a title for this image, include emotion, if it has emotion.",
-                "max_tokens": 512
-            }
+    session = HttpPool.get_session('cloudflare')
+    try:
+        with stage_seconds.time(('cloudflare', 'process')):
+            body = build_request_body(image, Cloudflare.ImageEncoding)
 
-            logger.debug(f"Sending request to {url} with headers: {headers} and inputs: {inputs}")
-            async with session.post(url, headers=headers, json=inputs) as response:
+        logger.debug(f"Sending request to {url}, image: {len(image)} bytes, body: {len(body)} bytes")
+        with stage_seconds.time(('cloudflare', 'inference')):
+            async with session.post(url, headers=headers, data=body) as response:
                 result = await response.json()
-                logger.debug(f"Received response: {result}")
-                if response.status == 200 and result.get("success"):
-                    description = result["result"].get("description", "[image 转文字失败]")
-                    logger.info(f"Image to text conversion successful: {description}")
-                    return description
-                else:
-                    error_message = result.get('errors', [{'message': '未知错误'}])[0]['message']
-                    logger.error(f"请求失败: {error_message}")
-                    return "[image 转文字失败]"
-        except aiohttp.ClientError as e:
-            logger.error(f"HTTP请求出错: {e}")
-            return "[image 转文字失败]"
-        except Exception as e:
-            logger.error(f"请求出错: {e}")
-            return "[image 转文字失败]"
+        # 响应可能很大, 只有开启 DEBUG 时才序列化
+        logger.opt(lazy=True).debug("Received response: {}", lambda: json.dumps(result, ensure_ascii=False))
+        if response.status == 200 and result.get("success"):
+            description = result["result"].get("description", IMAGE_TO_TEXT_FAILED)
+            logger.info(f"Image to text conversion successful: {description}")
+            return description
+        else:
+            error_message = result.get('errors', [{'message': '未知错误'}])[0]['message']
+            logger.error(f"请求失败: {error_message}")
+            return IMAGE_TO_TEXT_FAILED
+    except aiohttp.ClientError as e:
+        logger.error(f"HTTP请求出错: {e}")
+        return IMAGE_TO_TEXT_FAILED
+    except Exception as e:
+        logger.error(f"请求出错: {e}")
+        return IMAGE_TO_TEXT_FAILED
@@ -1,60 +1,119 @@
+import asyncio
 import base64
 import json
-import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from typing import Mapping
 
 import aiofiles
-import httpx
+import aiohttp
 from nonebot.log import logger
-from PIL import Image
 
-from core.ConfigProvider import Google
+from core.ConfigProvider import ConfigProvider, Google
+from utils.api.HttpPool import HttpPool
+from utils.ImageCache import ImageCacheManager
+from utils.Metrics import Metrics
+from utils.SingleFlight import SingleFlight
 
+# 相同 URL / 相同图片内容的并发请求共享一次下载与推理
+url_flight = SingleFlight(ttl=Google.ResultTTL)
+content_flight = SingleFlight(ttl=Google.ResultTTL)
 
-async def download_image(img_url: str) -> str:
-    logger.info(f"Downloading image from {img_url}")
+stage_seconds = Metrics.histogram('vision_stage_seconds', "图片识别各阶段耗时 (秒)", ('provider', 'stage'))
 
-    save_dir = "cache/imgs"
-    os.makedirs(save_dir, exist_ok=True)
+IMAGE_WIDTH = 512
+# 图片预处理在线程池中进行, PIL 解码/缩放/编码期间会释放 GIL
+executor: ThreadPoolExecutor | None = None
+# 最近一次预处理的各阶段耗时 (毫秒)
+last_timings: dict = {}
 
-    file_path = os.path.join(save_dir, f"{time.time()}.jpg")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(img_url)
-        if response.status_code == 200:
-            img_data = response.content
+async def fetch_image(img_url: str) -> bytes:
+    logger.info(f"Downloading image from {img_url}")
 
-            async with aiofiles.open(file=file_path, mode='wb') as f:
-                await f.write(img_data)
-            logger.info(f"Image saved to {file_path}")
+    session = HttpPool.get_session('image')
+    with stage_seconds.time(('gemini', 'download')):
+        async with session.get(img_url) as response:
+            if response.status == 200:
+                return await response.read()
+            else:
+                raise Exception(f"Failed to retrieve image. Status code: {response.status}")
 
-            return file_path
-        else:
-            raise Exception(f"Failed to retrieve image. Status code: {response.status_code}")
+
+async def download_image(img_url: str) -> str:
+    digest, _ = await ImageCacheManager.get_or_fetch(img_url, fetch_image)
+    file_path = ImageCacheManager.path(digest)
+    logger.info(f"Image saved to {file_path}")
+
+    return file_path
+
+
+def _encode_image_sync(img_data: bytes) -> tuple[str, dict]:
+    """
+    在工作线程中解码、缩放并重新编码图片, 返回 base64 编码与各阶段耗时 (毫秒)
+    """
+    # PIL 只在真正处理图片时导入, 未启用 Gemini 时不加载
+    from PIL import Image
+
+    timings = {}
+    start = time.perf_counter()
+
+    img = Image.open(BytesIO(img_data))
+    size = (IMAGE_WIDTH, max(1, int(img.height * IMAGE_WIDTH / img.width)))
+    # JPEG 解码时直接按 1/2、1/4、1/8 降采样到不小于目标尺寸, 其余格式忽略
+    img.draft('RGB', size)
+    img.load()
+    timings["decode"] = (time.perf_counter() - start) * 1000
+
+    mark = time.perf_counter()
+    img_resized = img.resize(size)
+
+    if img_resized.mode != 'RGB':
+        img_resized = img_resized.convert('RGB')
+    timings["resize"] = (time.perf_counter() - mark) * 1000
+
+    # save image to buffer
+    mark = time.perf_counter()
+    buffered = BytesIO()
+    img_resized.save(buffered, format="JPEG")
+    encoded_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    timings["encode"] = (time.perf_counter() - mark) * 1000
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return encoded_image, timings
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=max(1, Google.ImageWorkers), thread_name_prefix="image")
+    return executor
+
+
+async def encode_image(img_data: bytes) -> str:
+    loop = asyncio.get_running_loop()
+    with stage_seconds.time(('gemini', 'process')):
+        encoded_image, timings = await loop.run_in_executor(get_executor(), _encode_image_sync, img_data)
+
+    last_timings.clear()
+    last_timings.update(timings)
+    logger.info(f"Image encoded, decode: {timings['decode']:.1f}ms, resize: {timings['resize']:.1f}ms, "
+                f"encode: {timings['encode']:.1f}ms, total: {timings['total']:.1f}ms")
+    return encoded_image
 
 
 async def process_image(file_path: str) -> str:
     logger.info(f"Processing image {file_path}")
 
     async with aiofiles.open(file_path, 'rb') as image_file:
-        img = Image.open(BytesIO(await image_file.read()))
-        img_resized = img.resize((512, int(img.height * 512 / img.width)))
-
-        if img_resized.mode != 'RGB':
-            img_resized = img_resized.convert('RGB')
-
-        # save image to buffer
-        buffered = BytesIO()
-        img_resized.save(buffered, format="JPEG")
-        encoded_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
+        encoded_image = await encode_image(await image_file.read())
 
     logger.info("Image processed")
     return encoded_image
 
 
 async def send_request(encoded_image: str) -> dict:
-    url = f'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={Google.APIKey}'
+    url = f'{Google.BaseUrl}/v1beta/models/gemini-1.5-flash:generateContent?key={Google.APIKey}'
     headers = {
         'Content-Type': 'application/json'
     }
@@ -77,16 +136,18 @@ async def send_request(encoded_image: str) -> dict:
     logger.info(f"Sending request")
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=request_data, timeout=10)
-            logger.info(f"Request sent, waiting for response: {response.status_code}")
-            response_json = response.json()
-            logger.info("Request sent successfully")
-            return response_json
-    except httpx.HTTPStatusError as e:
+        session = HttpPool.get_session('gemini')
+        with stage_seconds.time(('gemini', 'inference')):
+            async with session.post(url, headers=headers, json=request_data,
+                                    timeout=aiohttp.ClientTimeout(total=10)) as response:
+                logger.info(f"Request sent, waiting for response: {response.status}")
+                response_json = await response.json(content_type=None)
+        logger.info("Request sent successfully")
+        return response_json
+    except aiohttp.ClientResponseError as e:
         logger.error(f"HTTP error occurred: {e}")
         raise
-    except httpx.RequestError as e:
+    except aiohttp.ClientError as e:
         logger.error(f"Request failed: {e}")
         raise
     except json.JSONDecodeError as e:
@@ -95,3 +156,44 @@ async def send_request(encoded_image: str) -> dict:
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
         raise
+
+
+async def describe_image(img_url: str) -> str:
+    """
+    获取图片的中文描述。
+
+    同一 URL 的并发请求只下载一次; 不同 URL 但内容相同的图片只推理一次。
+    完成后的结果会保留 Google.ResultTTL 秒, 服务稍后到达的相同请求。
+
+    :param img_url: 图片的URL地址
+    :return: 图片描述内容
+    """
+    return await url_flight.do(img_url, lambda: _describe_url(img_url))
+
+
+async def _describe_url(img_url: str) -> str:
+    digest, img_data = await ImageCacheManager.get_or_fetch(img_url, fetch_image)
+    return await content_flight.do(digest, lambda: _describe_data(img_data))
+
+
+async def _describe_data(img_data: bytes) -> str:
+    encoded_image = await encode_image(img_data)
+    response_json = await send_request(encoded_image)
+    return response_json['candidates'][0]['content']['parts'][0]['text']
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    """
+    ResultTTL 变化时替换 SingleFlight, 进行中的调用在旧实例上完成; ImageWorkers 变化时关闭旧线程池,
+    已提交的任务继续执行, 下一次预处理按新的线程数创建线程池。
+    """
+    global url_flight, content_flight, executor
+    if old.get('ResultTTL') != new.get('ResultTTL'):
+        url_flight = SingleFlight(ttl=Google.ResultTTL)
+        content_flight = SingleFlight(ttl=Google.ResultTTL)
+    if old.get('ImageWorkers') != new.get('ImageWorkers') and executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
+
+
+ConfigProvider.subscribe('Google', _on_config_changed)
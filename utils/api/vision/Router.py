@@ -0,0 +1,271 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Mapping
+
+from nonebot.log import logger
+
+from core.ConfigProvider import Cloudflare, ConfigProvider, Google, Vision
+from utils.api.vision import CloudFlare, GeminiFlash
+from utils.Metrics import Metrics
+
+request_seconds = Metrics.histogram('vision_request_seconds', "图片识别服务单次请求耗时 (秒)", ('provider', 'result'))
+errors_total = Metrics.counter('vision_errors_total', "图片识别服务失败次数", ('provider',))
+
+
+class VisionError(Exception):
+    pass
+
+
+class NoVisionProviderError(VisionError):
+    pass
+
+
+class ProviderState:
+    """
+    单个图片识别服务的滚动统计与熔断状态
+
+    Parameters
+    ----------
+    name : str
+        服务名称。
+    func : Callable[[str], Awaitable[str]]
+        识别函数, 接收图片 URL 返回描述, 失败时抛出异常。
+    enabled : Callable[[], bool]
+        返回该服务当前是否启用。
+    """
+
+    def __init__(self, name: str, func: Callable[[str], Awaitable[str]], enabled: Callable[[], bool]):
+        self.name = name
+        self.func = func
+        self.enabled = enabled
+        self.latencies: deque = deque(maxlen=Vision.Window)
+        self.outcomes: deque = deque(maxlen=Vision.Window)
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        # 图片 URL -> 进行中的调用数; 已记录过超时、且仍有调用在等待的 URL
+        self.in_flight: dict = {}
+        self.timed_out: set = set()
+
+    def record_success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.opened_at is not None:
+            logger.info(f"图片识别服务 {self.name} 已恢复")
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= ConfigProvider.snapshot.Vision.BreakerFailures:
+            if self.opened_at is None:
+                logger.warning(f"图片识别服务 {self.name} 连续失败 {self.consecutive_failures} 次, 熔断")
+            self.opened_at = time.monotonic()
+
+    def resize(self, window: int) -> None:
+        """
+        调整滚动窗口大小, 保留最近的样本。
+        """
+        self.latencies = deque(self.latencies, maxlen=window)
+        self.outcomes = deque(self.outcomes, maxlen=window)
+
+    def begin(self, url: str) -> None:
+        self.in_flight[url] = self.in_flight.get(url, 0) + 1
+
+    def end(self, url: str) -> None:
+        remaining = self.in_flight.pop(url, 1) - 1
+        if remaining > 0:
+            self.in_flight[url] = remaining
+        else:
+            self.timed_out.discard(url)
+
+    def record_timeout(self, url: str) -> None:
+        """
+        等待超时按一次失败计入。同一图片的并发请求由 SingleFlight 合并为一次上游调用,
+        在这些调用全部结束前只记录第一次超时。
+        """
+        if url in self.timed_out:
+            return
+        self.timed_out.add(url)
+        self.record_failure()
+
+    def available(self, now: float) -> bool:
+        """
+        熔断关闭时可用; 熔断打开且冷却结束后进入半开状态, 只放行一个试探请求。
+        """
+        if not self.enabled():
+            return False
+        if self.opened_at is None:
+            return True
+        return now - self.opened_at >= ConfigProvider.snapshot.Vision.BreakerCooldown and not self.probing
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        """
+        排序用的期望耗时: 中位延迟按成功率放大。没有样本的服务得分为 0, 优先获得流量。
+        """
+        median = self.percentile(0.5)
+        if median is None:
+            return 0.0
+        return median / max(0.05, 1.0 - self.error_rate())
+
+    def hedge_delay(self, default: float) -> float:
+        """
+        对冲等待时间: 样本足够时取 p95 延迟, 否则取 default。
+        """
+        p95 = self.percentile(0.95) if len(self.latencies) >= 5 else None
+        return max(0.2, p95 if p95 is not None else default)
+
+
+async def _cloudflare_describe(url: str) -> str:
+    description = await CloudFlare.image_to_text(url)
+    if description == CloudFlare.IMAGE_TO_TEXT_FAILED:
+        raise VisionError("Cloudflare 图片识别失败")
+    return description
+
+
+class VisionRouter:
+    """
+    根据滚动延迟与错误率选择图片识别服务
+
+    请求优先发给期望耗时最低的可用服务; 失败时立即改用下一个服务。
+    开启 Vision.Hedge 时, 若首选服务超过其 p95 延迟仍未返回, 会同时请求第二个服务, 取先成功的结果。
+    连续失败 Vision.BreakerFailures 次的服务会被熔断, 冷却 Vision.BreakerCooldown 秒后再试探。
+    """
+    providers: dict = {
+        'gemini': ProviderState('gemini', GeminiFlash.describe_image, lambda: Google.ENABLE),
+        'cloudflare': ProviderState('cloudflare', _cloudflare_describe, lambda: Cloudflare.ENABLE),
+    }
+
+    @classmethod
+    def ranked(cls) -> list:
+        now = time.monotonic()
+        return sorted((state for state in cls.providers.values() if state.available(now)), key=ProviderState.score)
+
+    @classmethod
+    async def _call(cls, state: ProviderState, url: str) -> str:
+        # 熔断半开时只有第一个调用方发送试探请求, 其余调用方直接换下一个服务
+        probe = state.opened_at is not None
+        if probe:
+            if state.probing:
+                raise VisionError(f"图片识别服务 {state.name} 正在试探恢复")
+            state.probing = True
+
+        start = time.monotonic()
+        state.begin(url)
+        try:
+            result = await state.func(url)
+        except asyncio.CancelledError:
+            # 被对冲请求抢先时, 已等待的时间是该服务延迟的下界, 同样计入统计
+            state.latencies.append(time.monotonic() - start)
+            request_seconds.observe(time.monotonic() - start, (state.name, 'cancelled'))
+            raise
+        except Exception as e:
+            request_seconds.observe(time.monotonic() - start, (state.name, 'error'))
+            # SingleFlight 合并的请求共享同一个异常对象, 一次上游失败只计入一次熔断统计
+            if not getattr(e, '_vision_recorded', False):
+                e._vision_recorded = True
+                logger.error(f"图片识别服务 {state.name} 出错: {e}")
+                state.record_failure()
+                errors_total.inc(labels=(state.name,))
+            raise
+        finally:
+            state.end(url)
+            if probe:
+                state.probing = False
+        state.record_success(time.monotonic() - start)
+        request_seconds.observe(time.monotonic() - start, (state.name, 'ok'))
+        return result
+
+    @classmethod
+    async def describe(cls, url: str) -> str:
+        """
+        获取图片描述。
+
+        :param url: 图片的URL地址
+        :return: 图片描述内容
+        """
+        candidates = cls.ranked()
+        if not candidates:
+            raise NoVisionProviderError("没有可用的图片识别服务")
+
+        # 一次识别只读取一次配置快照, 超时、对冲等参数在请求过程中保持一致
+        config = ConfigProvider.snapshot.Vision
+        deadline = time.monotonic() + config.Timeout
+        tasks: dict = {}
+        errors = []
+
+        def start(state: ProviderState):
+            logger.debug(f"图片识别请求发送到 {state.name}")
+            tasks[asyncio.ensure_future(cls._call(state, url))] = state
+
+        first = candidates.pop(0)
+        start(first)
+        hedge_at = time.monotonic() + first.hedge_delay(config.HedgeDelay) if config.Hedge else None
+
+        try:
+            while tasks:
+                now = time.monotonic()
+                if now >= deadline:
+                    for state in tasks.values():
+                        state.record_timeout(url)
+                    raise VisionError(f"图片识别超时 ({config.Timeout}s)")
+
+                timeout = deadline - now
+                if hedge_at is not None and candidates:
+                    timeout = min(timeout, max(0.0, hedge_at - now))
+
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge_at is not None and candidates and time.monotonic() >= hedge_at:
+                        hedge_at = None
+                        start(candidates.pop(0))
+                    continue
+
+                for task in done:
+                    state = tasks.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{state.name}: {task.exception()}")
+
+                # 全部失败时换下一个服务
+                if not tasks and candidates:
+                    start(candidates.pop(0))
+
+            raise VisionError("; ".join(errors))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @classmethod
+    def stats(cls) -> dict:
+        return {
+            name: {
+                "p50": state.percentile(0.5),
+                "p95": state.percentile(0.95),
+                "error_rate": state.error_rate(),
+                "open": state.opened_at is not None,
+            }
+            for name, state in cls.providers.items()
+        }
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    if old.get('Window') != new.get('Window'):
+        for state in VisionRouter.providers.values():
+            state.resize(Vision.Window)
+
+
+ConfigProvider.subscribe('Vision', _on_config_changed)
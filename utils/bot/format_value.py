@@ -1,8 +1,11 @@
 # transform value
-def convert_value(val: str | int | bool):
+def convert_value(val: str | int | bool | float):
     # int
     if val.isdigit():
         return int(val)
+    # float
+    if val.count('.') == 1 and val.replace('.', '', 1).isdigit():
+        return float(val)
     # bool
     if val.lower() in ['true', 'false']:
         return val.lower() == 'true'
@@ -1,42 +1,240 @@
+import weakref
 from datetime import datetime
+from typing import Mapping
 
 from nonebot.adapters.onebot.v11 import (Bot, GroupMessageEvent,
                                          PrivateMessageEvent)
 from nonebot.adapters.onebot.v11.exception import ActionFailed
+from nonebot.log import logger
+
+from core.ConfigProvider import ConfigProvider, MessageQueue, OpenAI
+from utils.LRUCache import LRUCache
+from utils.MessageQueue import MessageQueueManager
+
+
+def chat_key(event: GroupMessageEvent | PrivateMessageEvent) -> tuple | None:
+    if isinstance(event, GroupMessageEvent):
+        return 'group', event.group_id
+    if isinstance(event, PrivateMessageEvent):
+        return 'private', event.user_id
+    return None
+
+
+def _record_from_api(msg: dict) -> dict:
+    return {
+        "time": msg["time"],
+        "user_id": msg["user_id"],
+        "nickname": msg["sender"]["nickname"],
+        "message": msg.get("raw_message", msg["message"])
+    }
+
+
+class ChatHistory:
+    """
+    本地的会话消息索引
+
+    收到的消息由 chat_history 插件实时写入, 每个会话保存最近 MessageQueue.MaxQueueSize 条,
+    总内存受 MessageQueue.MaxBytes 限制, 超出后淘汰最久没有新消息的会话。
+    只有会话冷启动 (本地消息不足且尚未回填过) 时才会调用 OneBot 接口向前翻页回填。
+    """
+    manager: MessageQueueManager | None = None
+    # 已回填过的会话队列, 弱引用: 队列被淘汰后自动移除, 之后重新创建的队列会再回填一次
+    backfilled: weakref.WeakSet = weakref.WeakSet()
+    # 回填时最多翻页次数
+    MAX_PAGES: int = 5
+
+    @classmethod
+    def get_manager(cls) -> MessageQueueManager:
+        if cls.manager is None:
+            cls.manager = MessageQueueManager(max_bytes=MessageQueue.MaxBytes)
+        return cls.manager
+
+    @classmethod
+    def record(cls, event: GroupMessageEvent | PrivateMessageEvent) -> None:
+        """
+        记录一条收到的消息。
+        """
+        if (key := chat_key(event)) is None:
+            return
+
+        queue = cls.get_manager().get_or_create_queue(key, MessageQueue.MaxQueueSize)
+        queue.add_message(event.message_id, {
+            "time": event.time,
+            "user_id": event.user_id,
+            "nickname": event.sender.card or event.sender.nickname,
+            "message": event.raw_message
+        })
+
+    @classmethod
+    def latest(cls, key: tuple, count: int) -> list:
+        queue = cls.get_manager().get_queue(key)
+        if queue is None:
+            return []
+        messages = queue.get_all_messages()
+        return [record for _, record in messages[-count:]] if count > 0 else []
+
+    @classmethod
+    def is_backfilled(cls, key: tuple) -> bool:
+        queue = cls.get_manager().get_queue(key)
+        return queue is not None and queue in cls.backfilled
+
+    @classmethod
+    async def backfill(cls, bot: Bot, event: GroupMessageEvent | PrivateMessageEvent, count: int) -> None:
+        """
+        从 OneBot 实现向前翻页拉取历史消息, 以最旧一条消息的 message_seq 作为游标, 合并到本地索引之前。
+        """
+        key = chat_key(event)
+        queue = cls.get_manager().get_or_create_queue(key, MessageQueue.MaxQueueSize)
+        cls.backfilled.add(queue)
+
+        known = {message_id for message_id, _ in queue.get_all_messages()}
+        older: dict = {}
+        cursor = None
+
+        for _ in range(cls.MAX_PAGES):
+            params = {"count": count}
+            if cursor is not None:
+                params["message_seq"] = cursor
+            if key[0] == 'group':
+                response = await bot.call_api("get_group_msg_history", group_id=key[1], **params)
+            else:
+                response = await bot.call_api("get_friend_msg_history", user_id=key[1], **params)
+
+            messages = (response or {}).get('messages', [])
+            new = [msg for msg in messages if msg["message_id"] not in known and msg["message_id"] not in older]
+            if not new:
+                break
+            for msg in new:
+                older[msg["message_id"]] = _record_from_api(msg)
+
+            cursor = min(msg.get("message_seq", msg["message_id"]) for msg in new)
+            if len(older) + len(known) >= count:
+                break
+
+        if not older:
+            return
+
+        # 回填的消息更旧, 需要排在本地消息之前
+        merged = sorted(older.items(), key=lambda item: item[1]["time"]) + queue.get_all_messages()
+        queue.clear()
+        for message_id, record in merged[-queue.size:]:
+            queue.add_message(message_id, record)
+        logger.debug(f"会话 {key} 回填历史消息 {len(older)} 条")
 
 
 async def get_history_messages(bot: Bot, event: GroupMessageEvent | PrivateMessageEvent, count: int):
-    history = []
+    if (key := chat_key(event)) is None:
+        return []
+
+    history = ChatHistory.latest(key, count)
+    if len(history) >= count or ChatHistory.is_backfilled(key):
+        return history
+
     try:
-        if isinstance(event, GroupMessageEvent):
-            group_id = event.group_id
-            response = await bot.call_api("get_group_msg_history", group_id=group_id)
-        elif isinstance(event, PrivateMessageEvent):
-            user_id = event.user_id
-            response = await bot.call_api("get_friend_msg_history", user_id=user_id, count=count)
-        else:
-            return history
-
-        messages = response.get('messages', [])
-        for msg in messages:
-            if len(history) >= count:
-                break
-            history.append({
-                "time": datetime.fromtimestamp(msg["time"]),
-                "user_id": msg["user_id"],
-                "nickname": msg["sender"]["nickname"],
-                "message": msg["message"]
-            })
+        await ChatHistory.backfill(bot, event, count)
     except ActionFailed as e:
         print(f"ActionFailed: status={e.status}, retcode={e.retcode}, data={e.data}, echo={e.echo}")
         if e.retcode not in [100, 101]:
             raise e
-    return history
+    return ChatHistory.latest(key, count)
+
+
+# 常见模型的上下文窗口 (token), 未列出的模型只受 OpenAI.ContextTokens 限制
+MODEL_CONTEXT_WINDOWS: dict = {
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+    'gpt-4-turbo': 128000,
+    'gpt-4': 8192,
+    'gpt-3.5-turbo': 16385,
+}
+
+# 格式化结果缓存的最大条数, 每条约 200 字节
+FORMAT_CACHE_SIZE = 4096
+# 消息内容 -> (格式化后的行, token 数)
+format_cache = LRUCache(max_size=FORMAT_CACHE_SIZE, ttl=0)
+
+
+def count_tokens(text: str) -> int:
+    """
+    粗略估计 token 数: 非 ASCII 字符 (中文等) 按每字 1 个, ASCII 字符按每 4 个 1 个。
+    """
+    ascii_len = len(text.encode('ascii', 'ignore'))
+    return len(text) - ascii_len + (ascii_len + 3) // 4
+
+
+def context_budget() -> int:
+    """
+    当前模型可用于历史消息的 token 数: 配置的预算, 且不超过上下文窗口减去回复长度。
+    """
+    window = MODEL_CONTEXT_WINDOWS.get(OpenAI.MODEL)
+    if window is None:
+        return OpenAI.ContextTokens
+    return max(0, min(OpenAI.ContextTokens, window - OpenAI.MaxTokens))
+
+
+def format_history_line(msg: dict) -> tuple[str, int]:
+    """
+    格式化单条消息并计算其 token 数。
+    结果按消息内容缓存在 format_cache 中 (不写入消息记录, 不占用消息队列的内存预算), 之后的每轮对话直接复用。
+    """
+    message = msg['message']
+    key = (msg['time'], msg['user_id'], msg['nickname'], message if type(message) is str else repr(message))
+    if (cached := format_cache.get(key)) is not None:
+        return cached
+
+    line = (f"[{datetime.fromtimestamp(msg['time'])}][名字: {msg['nickname']}, QQ号: {msg['user_id']}]"
+            f"消息: \"{message}\"\n")
+    cached = (line, count_tokens(line))
+    format_cache.set(key, cached)
+    return cached
+
+
+def build_context(messages: list, budget: int | None = None) -> str:
+    """
+    从最新的消息开始向前取, 直到用完 token 预算, 再按时间顺序一次拼接。
+
+    Parameters
+    ----------
+    messages : list
+        按时间从旧到新排列的消息记录。
+    budget : int | None
+        token 预算, 为空时使用 context_budget()。
+
+    returns
+    -------
+    str
+        格式化后的历史消息。
+    """
+    if budget is None:
+        budget = context_budget()
+
+    lines = []
+    used = 0
+    for msg in reversed(messages):
+        line, tokens = format_history_line(msg)
+        if used + tokens > budget:
+            break
+        lines.append(line)
+        used += tokens
+
+    lines.reverse()
+    return ''.join(lines)
 
 
 def format_history_messages(messages):
-    formatted = ""
-    for msg in messages:
-        formatted += f"[{msg['time']}][名字: {msg['nickname']}, QQ号: {msg['user_id']}]消息: \"{msg['message']}\"\n"
-    return formatted
+    return ''.join(format_history_line(msg)[0] for msg in messages)
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    """
+    MaxBytes 变化后立即按新上限淘汰; MaxQueueSize 只对之后新建的会话队列生效。
+    """
+    if old.get('MaxQueueSize') != new.get('MaxQueueSize'):
+        logger.info(f"MessageQueue.MaxQueueSize 修改为 {MessageQueue.MaxQueueSize}, 只对新建的会话队列生效")
+    if old.get('MaxBytes') != new.get('MaxBytes') and ChatHistory.manager is not None:
+        ChatHistory.manager.max_bytes = MessageQueue.MaxBytes
+        if ChatHistory.manager.max_bytes > 0:
+            ChatHistory.manager.evict()
+
 
+ConfigProvider.subscribe('MessageQueue', _on_config_changed)
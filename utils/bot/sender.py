@@ -0,0 +1,164 @@
+import asyncio
+from typing import Hashable, Mapping
+
+from nonebot.adapters.onebot.v11 import Bot, GroupMessageEvent, PrivateMessageEvent
+from nonebot.log import logger
+
+from core.ConfigProvider import ConfigProvider
+from utils.Metrics import Metrics
+from utils.RateLimiter import RateLimiter, TokenBucket
+
+send_seconds = Metrics.histogram('outbound_send_seconds', "单条消息发送接口耗时 (秒)")
+wait_seconds = Metrics.histogram('outbound_wait_seconds', "发送前的打字延迟与限速等待 (秒)")
+messages_total = Metrics.counter('outbound_messages_total', "出站消息数", ('result',))
+
+
+class ReplyHandle:
+    """
+    一次回复的句子流
+
+    同一会话的回复按打开顺序依次发送, 一个回复的全部句子发完 (close 之后) 才开始发下一个,
+    因此并发触发的多个回复不会互相穿插。
+    """
+    __slots__ = ('sentences', 'closed')
+
+    def __init__(self):
+        self.sentences: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def put(self, sentence: str) -> None:
+        if sentence := sentence.strip():
+            self.sentences.put_nowait(sentence)
+
+    def extend(self, sentences: list) -> None:
+        for sentence in sentences:
+            self.put(sentence)
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            # 唤醒正在等待的发送者
+            self.sentences.put_nowait(None)
+
+
+def _join(left: str, right: str) -> str:
+    if left[-1].isascii() and left[-1].isalnum() and right[0].isascii() and right[0].isalnum():
+        return f"{left} {right}"
+    return left + right
+
+
+class ChatSender:
+    """
+    单个会话的发送队列, 由后台任务逐条发送, 队列空闲后任务自动退出
+    """
+
+    def __init__(self, key: Hashable, bot: Bot, event: GroupMessageEvent | PrivateMessageEvent):
+        self.key = key
+        self.bot = bot
+        self.event = event
+        self.replies: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+
+    def open(self) -> ReplyHandle:
+        handle = ReplyHandle()
+        self.replies.put_nowait(handle)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return handle
+
+    async def next_message(self, handle: ReplyHandle) -> str | None:
+        """
+        取出下一条要发送的消息, 紧接着已经到达的过短句子合并为一条。回复结束时返回 None。
+        """
+        message = await handle.sentences.get()
+        merge_length = ConfigProvider.snapshot.Sender.MergeLength
+        while message is not None and len(message) < merge_length and not handle.sentences.empty():
+            following = handle.sentences.get_nowait()
+            if following is None:
+                handle.sentences.put_nowait(None)
+                break
+            message = _join(message, following)
+        return message
+
+    async def run(self) -> None:
+        while not self.replies.empty():
+            handle: ReplyHandle = self.replies.get_nowait()
+            while (message := await self.next_message(handle)) is not None:
+                with wait_seconds.time():
+                    await OutboundSender.pace(self.bot.self_id, message)
+                try:
+                    with send_seconds.time():
+                        await self.bot.send(self.event, message)
+                except Exception as e:
+                    logger.error(f"会话 {self.key} 发送消息失败: {e}")
+                    messages_total.inc(labels=('error',))
+                else:
+                    messages_total.inc(labels=('ok',))
+        OutboundSender.release(self)
+
+
+class OutboundSender:
+    """
+    按会话排队的出站消息发送
+
+    matcher 只需打开一个 ReplyHandle 并写入句子即可返回, 实际发送由每个会话的后台任务完成:
+    发送前按 Sender.CharsPerSecond 模拟打字延迟 (不超过 Sender.MaxTypingDelay 秒),
+    并按账号限制每分钟最多 Sender.PerMinute 条, 避免触发风控; 短于 Sender.MergeLength 的相邻句子合并发送。
+    """
+    chats: dict = {}
+    accounts: dict = {}
+
+    @classmethod
+    def open(cls, bot: Bot, event: GroupMessageEvent | PrivateMessageEvent, key: Hashable) -> ReplyHandle:
+        """
+        为一次回复打开句子流, 回复结束后必须调用 handle.close()。
+
+        Parameters
+        ----------
+        bot : Bot
+            发送消息的 Bot。
+        event : GroupMessageEvent | PrivateMessageEvent
+            触发回复的事件, 决定回复的目标会话。
+        key : Hashable
+            会话标识。
+
+        returns
+        -------
+        ReplyHandle
+            回复的句子流。
+        """
+        sender = cls.chats.get(key)
+        if sender is None:
+            sender = cls.chats[key] = ChatSender(key, bot, event)
+        else:
+            sender.bot, sender.event = bot, event
+        return sender.open()
+
+    @classmethod
+    async def pace(cls, account: str, message: str) -> None:
+        config = ConfigProvider.snapshot.Sender
+        if config.CharsPerSecond > 0:
+            await asyncio.sleep(min(config.MaxTypingDelay, len(message) / config.CharsPerSecond))
+
+        bucket = cls.accounts.get(account)
+        if bucket is None:
+            per_second = config.PerMinute / 60
+            bucket = cls.accounts[account] = TokenBucket(per_second, per_second * RateLimiter.BURST_SECONDS)
+        await bucket.acquire(1)
+
+    @classmethod
+    def release(cls, sender: ChatSender) -> None:
+        """
+        发送任务退出时移除空闲的会话, 让会话状态不会无限增长。
+        """
+        if cls.chats.get(sender.key) is sender and sender.replies.empty():
+            del cls.chats[sender.key]
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    # 正在等待旧令牌桶的消息照常发送, 之后按新的限额为每个账号重新创建令牌桶
+    if old.get('PerMinute') != new.get('PerMinute'):
+        OutboundSender.accounts.clear()
+
+
+ConfigProvider.subscribe('Sender', _on_config_changed)
@@ -0,0 +1,130 @@
+import math
+import random
+import time
+from typing import Hashable, Mapping
+
+from core.ConfigProvider import ConfigProvider, FakePerson
+from utils.LRUCache import LRUCache
+from utils.Metrics import Metrics
+from utils.RateLimiter import RateLimiter, TokenBucket
+
+# 消息速率 EWMA 的时间常数 (秒)
+RATE_TAU = 60.0
+
+decisions_total = Metrics.counter('fake_person_decisions_total', "伪人触发判定次数, 按结果区分", ('result',))
+
+
+class ChatState:
+    """
+    单个会话的触发状态: 消息速率 (EWMA, 条/秒)、上次触发时间与令牌桶
+    """
+    __slots__ = ('rate', 'updated', 'last_trigger', 'bucket')
+
+    def __init__(self, now: float, config=None):
+        self.rate = 0.0
+        self.updated = now
+        self.last_trigger = -math.inf
+        per_second = (config or ConfigProvider.snapshot.FakePerson).GroupPerMinute / 60
+        self.bucket = TokenBucket(per_second, per_second * RateLimiter.BURST_SECONDS)
+
+    def observe(self, now: float) -> float:
+        """
+        记录一条新消息, 返回更新后的每分钟消息数。速率按指数衰减, 与时间间隔无关地 O(1) 更新。
+        """
+        self.rate = self.rate * math.exp(-(now - self.updated) / RATE_TAU) + 1 / RATE_TAU
+        self.updated = now
+        return self.rate * 60
+
+
+class TriggerScheduler:
+    """
+    伪人触发调度
+
+    每条消息依次经过: 会话冷却 (FakePerson.Cooldown 秒) -> 随机概率 -> 会话令牌桶 (FakePerson.GroupPerMinute)
+    -> 全局令牌桶 (FakePerson.GlobalPerMinute)。
+    触发概率随会话活跃度自适应: 基础概率为 FakePerson.Probability, 会话越活跃概率越低,
+    使每个会话的期望触发次数约为每分钟 FakePerson.TargetPerMinute 次。
+    无论群聊多吵, 调用模型的频率都不会超过全局限额。会话状态最多保留 FakePerson.MaxGroups 个, 按 LRU 淘汰。
+    """
+    states: LRUCache | None = None
+    global_bucket: TokenBucket | None = None
+
+    @classmethod
+    def reset(cls) -> None:
+        per_second = FakePerson.GlobalPerMinute / 60
+        cls.states = LRUCache(max_size=FakePerson.MaxGroups, ttl=0)
+        cls.global_bucket = TokenBucket(per_second, per_second * RateLimiter.BURST_SECONDS)
+
+    @staticmethod
+    def probability(messages_per_minute: float, config=None) -> float:
+        """
+        根据会话每分钟消息数计算触发概率。config 为 FakePerson 配置快照, 为空时取当前快照。
+        """
+        if config is None:
+            config = ConfigProvider.snapshot.FakePerson
+        if config.TargetPerMinute <= 0 or messages_per_minute <= 0:
+            return config.Probability
+        return min(config.Probability, config.TargetPerMinute / messages_per_minute)
+
+    @classmethod
+    def should_trigger(cls, key: Hashable, now: float | None = None) -> bool:
+        """
+        记录一条消息并决定是否触发回复。
+
+        Parameters
+        ----------
+        key : Hashable
+            会话标识, 例如 ('group', 群号)。
+        now : float | None
+            当前时间 (time.monotonic), 为空时自动获取。
+
+        returns
+        -------
+        bool
+            是否触发。
+        """
+        if cls.states is None:
+            cls.reset()
+        if now is None:
+            now = time.monotonic()
+
+        # 一次判定只读取一次配置快照
+        config = ConfigProvider.snapshot.FakePerson
+        state = cls.states.get(key)
+        if state is None:
+            state = ChatState(now, config)
+            cls.states.set(key, state)
+
+        probability = cls.probability(state.observe(now), config)
+        if now - state.last_trigger < config.Cooldown:
+            decisions_total.inc(labels=('cooldown',))
+            return False
+        if random.random() > probability:
+            decisions_total.inc(labels=('skipped',))
+            return False
+        if not state.bucket.try_acquire(1, now):
+            decisions_total.inc(labels=('chat_limited',))
+            return False
+        if not cls.global_bucket.try_acquire(1, now):
+            state.bucket.refund(1)
+            decisions_total.inc(labels=('global_limited',))
+            return False
+
+        state.last_trigger = now
+        decisions_total.inc(labels=('triggered',))
+        return True
+
+    @classmethod
+    def stats(cls) -> dict:
+        if cls.states is None:
+            return {"chats": 0}
+        return {"chats": len(cls.states), "global_tokens": cls.global_bucket.tokens}
+
+
+def _on_config_changed(old: Mapping, new: Mapping) -> None:
+    keys = ('GroupPerMinute', 'GlobalPerMinute', 'MaxGroups')
+    if any(old.get(key) != new.get(key) for key in keys):
+        TriggerScheduler.reset()
+
+
+ConfigProvider.subscribe('FakePerson', _on_config_changed)